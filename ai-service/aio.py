@@ -0,0 +1,197 @@
+"""The shared asyncio event loop the processing pipelines run on.
+
+The pipelines are coroutines on one event loop per process: provider calls
+go through aio_http, ffmpeg runs as an asyncio subprocess, and a job waiting
+on Deepgram or OpenRouter holds no thread. Under the ASGI entry point
+(asgi.py) the server's own loop is attached; under gunicorn/Flask the loop
+runs in a background thread and the synchronous endpoints, job queue workers
+and batches hand their pipeline to it with run(), blocking only the calling
+thread.
+
+Calls into libraries that have no async interface (youtube-transcript-api,
+yt-dlp's helper pool, file hashing) are offloaded to a bounded thread pool
+with offload(), so they can't grow the thread count with the number of jobs.
+Stage limits (AIO_STAGE_CONCURRENCY_*) cap how many pipelines are in each
+stage at once.
+"""
+import os
+import time
+import asyncio
+import functools
+import threading
+import contextvars
+import logging
+import concurrent.futures
+from contextlib import asynccontextmanager
+
+import tracing
+from job_store import job_store
+from jobs import job_queue
+
+logger = logging.getLogger(__name__)
+
+# Threads for blocking library calls made from coroutines
+AIO_BLOCKING_THREADS = int(os.getenv('AIO_BLOCKING_THREADS', 32))
+# Coroutines allowed in each stage at once; they hold no thread, so these are provider limits
+AIO_STAGE_CONCURRENCY = {
+    'transcribe': int(os.getenv('AIO_STAGE_CONCURRENCY_TRANSCRIBE', 32)),
+    'generate': int(os.getenv('AIO_STAGE_CONCURRENCY_GENERATE', 32)),
+}
+
+
+class EventLoop:
+    """One event loop per process, owned (background thread) or attached (ASGI server)."""
+
+    def __init__(self, blocking_threads: int, stage_limits: dict):
+        self.blocking_threads = max(1, blocking_threads)
+        self.stage_limits = dict(stage_limits)
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._executor = None
+        self._semaphores = {}
+        self._lock = threading.Lock()
+        self._counters = {"tasks": 0, "completed": 0, "failed": 0, "cancelled": 0, "offloaded": 0}
+        self._in_flight = 0
+        self._peak = 0
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Use a loop someone else runs (the ASGI server's) instead of starting one."""
+        if self._loop is loop and self._pid == os.getpid():
+            return
+        with self._lock:
+            self._reset_locked()
+            self._loop = loop
+            self._thread = None
+            self._pid = os.getpid()
+
+    def ensure_started(self) -> asyncio.AbstractEventLoop:
+        """The process's loop, started on first use (fork safe: a forked worker starts its own)."""
+        loop = self._loop
+        if self._pid == os.getpid() and loop is not None and not loop.is_closed():
+            return loop
+        with self._lock:
+            if self._pid == os.getpid() and self._loop is not None and not self._loop.is_closed():
+                return self._loop
+            self._reset_locked()
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._serve, args=(loop,), name="aio-loop", daemon=True)
+            self._thread.start()
+            self._loop = loop
+            self._pid = os.getpid()
+            logger.info("✓ Pipeline event loop started")
+            return loop
+
+    def _reset_locked(self):
+        # Semaphores and the executor belong to the previous loop / parent process
+        self._semaphores = {}
+        self._executor = None
+        self._in_flight = 0
+
+    @staticmethod
+    def _serve(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+
+    def _count(self, counter: str, n: int = 1):
+        with self._lock:
+            self._counters[counter] += n
+
+    async def track(self, coro):
+        """Await coro, counting it as an in-flight job of this loop."""
+        with self._lock:
+            self._counters["tasks"] += 1
+            self._in_flight += 1
+            self._peak = max(self._peak, self._in_flight)
+        try:
+            result = await coro
+        except asyncio.CancelledError:
+            self._count("cancelled")
+            raise
+        except Exception:
+            self._count("failed")
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        self._count("completed")
+        return result
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Schedule coro on the loop from any other thread."""
+        loop = self.ensure_started()
+        return asyncio.run_coroutine_threadsafe(self.track(coro), loop)
+
+    def run(self, coro, cancel: threading.Event = None):
+        """Run coro on the loop and wait for its result: the synchronous endpoints' thin wrapper.
+
+        Setting cancel cancels the coroutine (raising concurrent.futures.CancelledError here).
+        """
+        loop = self.ensure_started()
+        if self._on_loop_thread(loop):
+            coro.close()
+            raise RuntimeError("EventLoop.run() called from the event loop itself; await the coroutine instead")
+        future = self.submit(coro)
+        if cancel is None:
+            return future.result()
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except concurrent.futures.TimeoutError:
+                if cancel.is_set():
+                    future.cancel()
+                    raise concurrent.futures.CancelledError()
+
+    @staticmethod
+    def _on_loop_thread(loop: asyncio.AbstractEventLoop) -> bool:
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
+
+    async def offload(self, fn, *args):
+        """Run a blocking call on the bounded pool, under the calling task's trace."""
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.blocking_threads, thread_name_prefix="aio-blocking")
+        self._count("offloaded")
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(context.run, fn, *args))
+
+    @asynccontextmanager
+    async def stage(self, name: str):
+        """Mark the job as being in stage `name` and hold one of the stage's AIO_STAGE_CONCURRENCY slots.
+
+        The stage is a span of the job's trace; time spent waiting for the slot is its waitSeconds.
+        """
+        job_queue.set_stage(name)
+        job_store.set_stage(name)
+        semaphore = self._semaphores.get(name)
+        if semaphore is None and name in self.stage_limits:
+            semaphore = self._semaphores[name] = asyncio.Semaphore(max(1, self.stage_limits[name]))
+        with tracing.span(name) as attrs:
+            if semaphore is None:
+                yield
+                return
+            start = time.perf_counter()
+            async with semaphore:
+                waited = time.perf_counter() - start
+                if waited >= 0.001:
+                    attrs["waitSeconds"] = round(waited, 3)
+                yield
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "running": self._loop is not None and self._pid == os.getpid(),
+                "attached": self._loop is not None and self._thread is None,
+                "inFlight": self._in_flight,
+                "peakInFlight": self._peak,
+                "blockingThreads": self.blocking_threads,
+                "stageConcurrency": self.stage_limits,
+            }
+
+
+event_loop = EventLoop(AIO_BLOCKING_THREADS, AIO_STAGE_CONCURRENCY)
@@ -0,0 +1,238 @@
+"""Asyncio HTTP clients for the provider APIs, used by the pipelines.
+
+The coroutine counterpart of http_client.ProviderClient, built on
+httpx.AsyncClient: keep-alive connections per provider (up to pool_size idle
+ones are kept, enough for every call a full stage can have in flight), separate connect/write/read timeouts and the same retry
+policy (RETRY_STATUSES, retry_delay()). A request in flight holds no thread,
+and cancelling the calling task closes its connection. Bodies are bytes,
+JSON, or a file streamed from disk in chunks read on the event loop's
+blocking pool (re-opened on each retry), so a large upload never blocks the
+loop and a stalled one fails after HTTP_WRITE_TIMEOUT. stream() hands back
+the response before its body is read, for server-sent events.
+"""
+import os
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+
+import httpx
+
+import tracing
+from aio import AIO_STAGE_CONCURRENCY, event_loop
+from http_client import (HTTP_CONNECT_TIMEOUT, HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX,
+                         RETRY_STATUSES, pool_size, retry_delay, status_outcome)
+from media import CHUNK_PARALLELISM
+from metrics import upstream_bytes, upstream_requests
+
+logger = logging.getLogger(__name__)
+
+# Longest a request body may make no progress (a stalled upload) before the request fails
+HTTP_WRITE_TIMEOUT = float(os.getenv('HTTP_WRITE_TIMEOUT', 60))
+
+# Map-reduce notes calls one generation has in flight (the same setting main.py reads)
+GENERATION_MAP_PARALLELISM = int(os.getenv('GENERATION_MAP_PARALLELISM', 4))
+
+CHUNK_SIZE = 256 * 1024
+USER_AGENT = 'vdo-ai-service'
+
+
+class HTTPError(Exception):
+    pass
+
+
+class ConnectError(HTTPError):
+    """The connection failed or broke before a response arrived (retryable)."""
+
+
+class Timeout(HTTPError):
+    """The body stalled for the write timeout or the response for the read timeout (not retried,
+    like requests.ReadTimeout)."""
+
+
+class AsyncProviderClient:
+    """Keep-alive connections to one provider with retries, for use on the event loop."""
+
+    def __init__(self, name: str, pool_size: int, read_timeout: float,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT, write_timeout: float = HTTP_WRITE_TIMEOUT,
+                 max_retries: int = HTTP_MAX_RETRIES, backoff_base: float = HTTP_BACKOFF_BASE,
+                 backoff_max: float = HTTP_BACKOFF_MAX):
+        self.name = name
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.write_timeout = write_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client = None
+        self._loop = None
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "retries": 0, "failures": 0, "newConnections": 0,
+                          "reusedConnections": 0}
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _session(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or loop is not self._loop:
+            # Connections belong to the loop that opened them (a new loop after fork or re-attach)
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=self.pool_size),
+                headers={'User-Agent': USER_AGENT})
+            self._loop = loop
+        return self._client
+
+    def _timeout(self, read_timeout: float = None) -> httpx.Timeout:
+        return httpx.Timeout(connect=self.connect_timeout, write=self.write_timeout,
+                             read=read_timeout or self.read_timeout, pool=self.connect_timeout)
+
+    async def request(self, method: str, url: str, headers: dict = None, data=None, json_body=None,
+                      file: str = None, params: dict = None, read_timeout: float = None) -> httpx.Response:
+        """Send a request, retrying connection errors and retryable statuses.
+
+        data is bytes or str, json_body is serialized as JSON, file is a path streamed as the body.
+        """
+        return await self._request(method, url, headers, data, json_body, file, params, read_timeout)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, headers: dict = None, json_body=None,
+                     read_timeout: float = None):
+        """Send a request and yield the response before its body is read (iterate response.aiter_lines()).
+
+        Retries happen only until a response starts; the connection is released on exit.
+        """
+        response = await self._request(method, url, headers, None, json_body, None, None, read_timeout,
+                                       stream=True)
+        try:
+            yield response
+        except httpx.ReadTimeout as e:
+            raise Timeout(f"stream stalled for {read_timeout or self.read_timeout:.0f}s") from e
+        except httpx.TransportError as e:
+            raise ConnectError(str(e) or type(e).__name__) from e
+        finally:
+            await response.aclose()
+
+    async def _request(self, method: str, url: str, headers: dict, data, json_body, file: str, params: dict,
+                       read_timeout: float, stream: bool = False) -> httpx.Response:
+        headers = dict(headers or {})
+        length = None
+        if file:
+            length = await event_loop.offload(os.path.getsize, file)
+            headers['Content-Length'] = str(length)
+        elif isinstance(data, str):
+            data = data.encode('utf-8')
+
+        attempt = 0
+        while True:
+            self._count("requests")
+            try:
+                with tracing.span(self.name, kind='http', method=method, attempt=attempt + 1) as attrs:
+                    response = await self._send(method, url, headers, data, json_body, file, params,
+                                                read_timeout, stream)
+                    attrs["status"] = response.status_code
+            except HTTPError as e:
+                timed_out = isinstance(e, Timeout)
+                upstream_requests.inc(provider=self.name, outcome='timeout' if timed_out else 'connection_error')
+                # A timeout on a long upload is not worth repeating blindly
+                if timed_out or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                delay = retry_delay(attempt, None, self.backoff_base, self.backoff_max)
+                logger.warning(f"{self.name} request failed ({e}), retrying in {delay:.1f}s")
+            else:
+                upstream_requests.inc(provider=self.name, outcome=status_outcome(response.status_code))
+                sent = length if file else len(response.request.content)
+                upstream_bytes.inc(sent, provider=self.name)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    if response.status_code >= 400:
+                        self._count("failures")
+                    return response
+                delay = retry_delay(attempt, response.headers.get('retry-after'), self.backoff_base,
+                                    self.backoff_max)
+                if stream:
+                    await response.aclose()
+                logger.warning(f"{self.name} returned {response.status_code}, retrying in {delay:.1f}s")
+            self._count("retries")
+            tracing.event('retry', provider=self.name, attempt=attempt + 1, delay=round(delay, 2))
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def _send(self, method: str, url: str, headers: dict, data: bytes, json_body, file: str,
+                    params: dict, read_timeout: float, stream: bool) -> httpx.Response:
+        opened = []
+
+        async def trace(event: str, info: dict):
+            if event == 'connection.connect_tcp.complete':
+                opened.append(True)
+
+        client = self._session()
+        try:
+            request = client.build_request(
+                method, url, headers=headers, params=params, json=json_body,
+                content=_file_chunks(file) if file else data, timeout=self._timeout(read_timeout),
+                extensions={'trace': trace})
+            response = await client.send(request, stream=stream)
+        except httpx.WriteTimeout as e:
+            raise Timeout(f"request body stalled for {self.write_timeout:.0f}s") from e
+        except httpx.ReadTimeout as e:
+            raise Timeout(f"no response within {read_timeout or self.read_timeout:.0f}s") from e
+        except httpx.TransportError as e:
+            raise ConnectError(str(e) or type(e).__name__) from e
+        finally:
+            if opened:
+                self._count("newConnections")
+        if not opened:
+            self._count("reusedConnections")
+        return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {**counters, "poolSize": self.pool_size}
+
+
+async def _file_chunks(path: str):
+    """The file at path in CHUNK_SIZE pieces, opened and read on the blocking pool."""
+    f = await event_loop.offload(open, path, 'rb')
+    try:
+        while True:
+            chunk = await event_loop.offload(f.read, CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        f.close()
+
+
+# One client per outbound provider. Idle pools are sized to the stage limit times each pipeline's
+# fan-out (chunked transcription, map-reduce notes), so a full stage reuses every connection
+deepgram_async = AsyncProviderClient(
+    'deepgram',
+    pool_size=pool_size(AIO_STAGE_CONCURRENCY['transcribe'], CHUNK_PARALLELISM),
+    read_timeout=float(os.getenv('DEEPGRAM_READ_TIMEOUT', 300)),
+)
+openrouter_async = AsyncProviderClient(
+    'openrouter',
+    pool_size=pool_size(AIO_STAGE_CONCURRENCY['generate'], GENERATION_MAP_PARALLELISM),
+    read_timeout=float(os.getenv('OPENROUTER_READ_TIMEOUT', 300)),
+)
+assemblyai_async = AsyncProviderClient(
+    'assemblyai',
+    pool_size=pool_size(AIO_STAGE_CONCURRENCY['transcribe']),
+    read_timeout=float(os.getenv('ASSEMBLYAI_READ_TIMEOUT', 300)),
+)
+
+ASYNC_PROVIDER_CLIENTS = {client.name: client for client in (deepgram_async, openrouter_async, assemblyai_async)}
+
+
+def async_client_stats() -> dict:
+    return {name: client.stats() for name, client in ASYNC_PROVIDER_CLIENTS.items()}
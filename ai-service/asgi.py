@@ -0,0 +1,250 @@
+"""ASGI entry point: the processing endpoints as coroutines on the server's event loop.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker -w 4 -b 0.0.0.0:5000 asgi:app
+
+POST /api/process-youtube and /api/process-video (without "async"/"stream",
+which queue a job as usual) await the pipeline coroutines from main.py directly:
+a request waiting on a provider holds no thread, and if the client
+disconnects the pipeline task is cancelled, which closes its provider
+connections and kills ffmpeg. GET /health is answered on the loop.
+
+Every other route is served by the Flask app through a2wsgi's WSGI bridge,
+on ASGI_WSGI_THREADS threads, so the API is the same under either server;
+the bridged endpoints and queued jobs hand their pipelines to this loop too.
+Flask's request hooks (CORS, metrics) run for the native endpoints as well.
+"""
+import os
+import io
+import asyncio
+import logging
+
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from flask import request, jsonify
+
+import main
+from main import app as flask_app
+from aio import event_loop
+
+logger = logging.getLogger(__name__)
+
+# Status recorded (not sent) for requests whose client disconnected, as nginx logs them
+CLIENT_CLOSED = 499
+# Threads serving bridged (WSGI) requests; event streams hold one for as long as they are open
+ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 64))
+
+
+class Pipeline:
+    """A native handler's answer when the response is the result of a pipeline coroutine."""
+
+    def __init__(self, coro, label: str, job_id: str):
+        self.coro = coro
+        self.label = label
+        self.job_id = job_id
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    _attach()
+    handler = NATIVE_ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        await _bridge(scope, receive, send)
+        return
+    body = await _read_body(receive)
+    if body is None:
+        return
+    await _native(scope, receive, send, body, handler)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            _attach()
+            logger.info("✓ ASGI app started (async pipelines on the server's event loop)")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def _attach():
+    event_loop.attach(asyncio.get_running_loop())
+
+
+async def _read_body(receive) -> bytes:
+    """The whole request body, or None if the client went away first."""
+    parts = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        parts.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(parts)
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Native endpoints
+# ---------------------------------------------------------------------------
+
+async def _native(scope, receive, send, body: bytes, handler):
+    """Run handler in a Flask request context, with the app's before/after/teardown hooks.
+
+    handler (a function or coroutine function) returns a response, a Pipeline to await, or None to defer
+    to the WSGI bridge. The pipeline is cancelled if the client disconnects first.
+    """
+    environ = build_environ(scope, io.BytesIO(body))
+    ctx = flask_app.request_context(environ)
+    ctx.push()
+    try:
+        response = flask_app.preprocess_request()
+        if response is None:
+            outcome = handler()
+            if asyncio.iscoroutine(outcome):
+                outcome = await outcome
+            if outcome is None:
+                # Queued/streamed jobs and anything unusual: let the Flask view handle it
+                ctx.pop()
+                ctx = None
+                await _bridge(scope, receive, send, body)
+                return
+            if isinstance(outcome, Pipeline):
+                outcome = await _run_pipeline(receive, outcome)
+            response = outcome
+        response = flask_app.make_response(response)
+        response = flask_app.process_response(response)
+        if response.status_code == CLIENT_CLOSED:
+            return
+        await send({'type': 'http.response.start', 'status': response.status_code,
+                    'headers': _headers(response.headers.items())})
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+    finally:
+        if ctx is not None:
+            ctx.pop()
+
+
+async def _run_pipeline(receive, pipeline: Pipeline):
+    job_id = pipeline.job_id
+    task = asyncio.ensure_future(event_loop.track(pipeline.coro))
+    disconnect = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await asyncio.wait({task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        if not task.done():
+            task.cancel()
+        disconnect.cancel()
+    if task.cancelled() or not task.done():
+        logger.info(f"Client disconnected - cancelled job {job_id}")
+        try:
+            await task
+        except BaseException:
+            pass
+        # Never sent; recorded in the request metrics as cancelled
+        return jsonify({"error": "Client disconnected", "jobId": job_id}), CLIENT_CLOSED
+    try:
+        return jsonify(task.result()), 200
+    except Exception as e:
+        error_msg = f"{pipeline.label} error: {str(e)}"
+        logger.error(error_msg)
+        return jsonify({"error": error_msg, "jobId": job_id}), 500
+
+
+def _queued(data) -> bool:
+    return main.request_flag(data, 'stream') or main.request_flag(data, 'async', main.JOB_MODE_ASYNC_DEFAULT)
+
+
+async def process_youtube():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or _queued(data) or main.request_template(data) is None:
+        return None
+    job_id = main.request_job_id(data)
+    youtube_url = data.get('youtubeUrl')
+    logger.info(f"Processing YouTube URL: {youtube_url} (Job: {job_id}) - Medium style")
+    video_id = main.extract_youtube_video_id(youtube_url or '')
+    if not video_id:
+        return jsonify({"error": "Invalid YouTube URL", "jobId": job_id}), 400
+    logger.info(f"Extracted video ID: {video_id}")
+    # A SQLite read, kept off the loop
+    stored = await event_loop.offload(main.stored_result, data)
+    if stored:
+        return jsonify(stored), 200
+    pipeline = main.run_youtube_pipeline_async(job_id, video_id, main.request_flag(data, 'regenerate'),
+                                               main.request_languages(data), main.request_template(data))
+    return Pipeline(pipeline, "YouTube processing", job_id)
+
+
+async def process_video():
+    data = request.get_json(silent=True)
+    if (not isinstance(data, dict) or _queued(data) or not isinstance(data.get('videoPath'), str)
+            or main.request_template(data) is None):
+        return None
+    job_id = main.request_job_id(data)
+    logger.info(f"Processing video: {data['videoPath']} (Job: {job_id})")
+    stored = await event_loop.offload(main.stored_result, data)
+    if stored:
+        return jsonify(stored), 200
+    pipeline = main.run_video_pipeline_async(job_id, main.resolve_video_path(data['videoPath']),
+                                             main.request_flag(data, 'regenerate'), main.request_template(data))
+    return Pipeline(pipeline, "Processing", job_id)
+
+
+NATIVE_ROUTES = {
+    ('GET', '/health'): main.health,
+    ('POST', '/api/process-youtube'): process_youtube,
+    ('POST', '/api/process-video'): process_video,
+}
+
+
+# ---------------------------------------------------------------------------
+# WSGI bridge for the rest of the Flask app
+# ---------------------------------------------------------------------------
+
+_wsgi = None
+_wsgi_pid = None
+
+
+def _flask_wsgi(environ, start_response):
+    # a2wsgi's wsgi.input ends with the request body, so Werkzeug can read chunked uploads too
+    environ['wsgi.input_terminated'] = True
+    return flask_app(environ, start_response)
+
+
+def _wsgi_app() -> WSGIMiddleware:
+    """a2wsgi's bridge to the Flask app, created per worker process (its thread pool doesn't survive a fork)."""
+    global _wsgi, _wsgi_pid
+    if _wsgi is None or _wsgi_pid != os.getpid():
+        _wsgi = WSGIMiddleware(_flask_wsgi, workers=max(1, ASGI_WSGI_THREADS))
+        _wsgi_pid = os.getpid()
+    return _wsgi
+
+
+async def _bridge(scope, receive, send, body: bytes = None):
+    """Serve the request with the Flask app; body is the request body if it was already received."""
+    if body is not None:
+        replayed = False
+
+        async def receive_replayed():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await receive()
+
+        await _wsgi_app()(scope, receive_replayed, send)
+        return
+    await _wsgi_app()(scope, receive, send)
+
+
+def _headers(headers) -> list:
+    return [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers]
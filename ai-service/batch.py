@@ -0,0 +1,141 @@
+"""Batch ingestion of many YouTube videos with bounded concurrency.
+
+A batch is a list of video IDs run through the YouTube pipeline by a few
+worker threads. BATCH_CONCURRENCY caps the videos in flight across all
+batches in the process, and provider slots (BATCH_YOUTUBE_CONCURRENCY,
+BATCH_OPENROUTER_CONCURRENCY) cap how many of them hit each upstream at once,
+so a large playlist can't crowd out interactive requests. Results are yielded
+as each video finishes. Completed videos are remembered in the batch cache,
+so a re-run of the same list only processes what isn't done yet.
+"""
+import os
+import time
+import queue
+import threading
+import contextvars
+import logging
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 4))
+BATCH_MAX_VIDEOS = int(os.getenv('BATCH_MAX_VIDEOS', 200))
+BATCH_PROVIDER_CONCURRENCY = {
+    'youtube': int(os.getenv('BATCH_YOUTUBE_CONCURRENCY', 2)),
+    'openrouter': int(os.getenv('BATCH_OPENROUTER_CONCURRENCY', 2)),
+}
+
+
+# Set on batch worker threads; copied into the pipeline coroutine each item waits on
+_batch_item = contextvars.ContextVar('batch_item', default=False)
+
+
+class BatchRunner:
+    """Runs batch items on worker threads under a process-wide limit and per-provider slots."""
+
+    def __init__(self, concurrency: int, provider_limits: dict):
+        self.concurrency = max(1, concurrency)
+        self._provider_limits = dict(provider_limits)
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._providers = {}
+        self._providers_loop = None
+        self._lock = threading.Lock()
+        self._counters = {"batches": 0, "videos": 0, "completed": 0, "failed": 0, "skipped": 0}
+        self._in_flight = 0
+
+    def _count(self, counter: str, n: int = 1):
+        with self._lock:
+            self._counters[counter] += n
+
+    @asynccontextmanager
+    async def provider(self, name: str):
+        """Hold a `name` provider slot if this pipeline is running a batch item; a no-op otherwise."""
+        if name not in self._provider_limits or not _batch_item.get():
+            yield
+            return
+        async with self._provider_semaphore(name):
+            yield
+
+    def _provider_semaphore(self, name: str):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if loop is not self._providers_loop:
+            # Semaphores belong to one loop (a new one after fork or re-attach)
+            self._providers = {}
+            self._providers_loop = loop
+        semaphore = self._providers.get(name)
+        if semaphore is None:
+            semaphore = self._providers[name] = asyncio.Semaphore(max(1, self._provider_limits[name]))
+        return semaphore
+
+    def run(self, items: list, fn, cancel: threading.Event = None):
+        """Call fn(item) for each item and yield (item, result, error, seconds) as they finish.
+
+        Setting cancel (e.g. when the client disconnects) stops items that
+        haven't started; running ones finish in the background.
+        """
+        cancel = cancel or threading.Event()
+        todo = queue.Queue()
+        for item in items:
+            todo.put(item)
+        done = queue.Queue()
+        workers = min(self.concurrency, len(items))
+        self._count("batches")
+
+        def work():
+            _batch_item.set(True)
+            while not cancel.is_set():
+                try:
+                    item = todo.get_nowait()
+                except queue.Empty:
+                    break
+                self._run_item(item, fn, cancel, done)
+            done.put(None)
+
+        for i in range(workers):
+            threading.Thread(target=work, name=f"batch-worker-{i}", daemon=True).start()
+
+        finished_workers = 0
+        while finished_workers < workers:
+            item = done.get()
+            if item is None:
+                finished_workers += 1
+                continue
+            yield item
+
+    def _run_item(self, item, fn, cancel: threading.Event, done: queue.Queue):
+        # Wait for a process-wide slot without ignoring cancellation
+        while not self._slots.acquire(timeout=0.5):
+            if cancel.is_set():
+                return
+        with self._lock:
+            self._in_flight += 1
+            self._counters["videos"] += 1
+        start = time.time()
+        try:
+            result, error = fn(item), None
+            self._count("completed")
+        except Exception as e:
+            result, error = None, str(e)
+            self._count("failed")
+            logger.error(f"Batch item {item} failed: {e}")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+        done.put((item, result, error, time.time() - start))
+
+    def record_skipped(self, n: int):
+        self._count("skipped", n)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "inFlight": self._in_flight,
+                "concurrency": self.concurrency,
+                "providerConcurrency": self._provider_limits,
+            }
+
+
+batch_runner = BatchRunner(BATCH_CONCURRENCY, BATCH_PROVIDER_CONCURRENCY)
@@ -0,0 +1,126 @@
+"""Cold start: how long a fresh service process takes to answer GET /health.
+
+Starts the service --runs times on a free port, polls /health every few
+milliseconds and records the time from spawn to the first 200. It then
+reads the startup report under "startup" in GET /debug (interpreter, import
+and init seconds, and the deferred imports) and stops the process.
+
+    main      python main.py (Flask's server)
+    gunicorn  gunicorn main:app with gunicorn.conf.py (preloaded, 1 worker)
+
+Prints p50/p95/max per measure; --budget fails the run (exit 1) if the p95
+time to /health is over that many seconds.
+
+    python benchmarks/cold_start.py [--server main] [--runs 10] [--budget 1.5] [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from load_test import distribution  # noqa: E402
+
+# Commands run in ai-service/; both listen on $PORT
+SERVERS = {
+    'main': [sys.executable, 'main.py'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '--workers', '1', 'main:app'],
+}
+POLL_INTERVAL = 0.005
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def get(url: str, timeout: float = 1.0):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def one_start(server: str, timeout: float, env: dict) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(SERVERS[server], cwd=SERVICE_DIR, env={**env, 'PORT': str(port)},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"{server} exited with {process.returncode} before answering /health")
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError(f"/health not ready within {timeout:.0f}s")
+            try:
+                status, _ = get(f"{base}/health", timeout=0.5)
+                if status == 200:
+                    break
+            except OSError:
+                pass
+            time.sleep(POLL_INTERVAL)
+        health = time.perf_counter() - started
+        _, body = get(f"{base}/debug", timeout=30)
+        return {"health": health, "startup": json.loads(body).get("startup") or {}}
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', choices=sorted(SERVERS), default='main')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--timeout', type=float, default=30, help='seconds to wait for /health per run')
+    parser.add_argument('--budget', type=float, help='fail if p95 seconds to /health exceed this')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    # Never let a benchmark process reach a real provider
+    env = {key: value for key, value in os.environ.items() if not key.endswith('_API_KEY')}
+    runs = []
+    for index in range(args.runs):
+        run = one_start(args.server, args.timeout, env)
+        runs.append(run)
+        print(f"  run {index + 1}: /health after {run['health'] * 1000:.0f} ms")
+
+    def measure(key):
+        values = [run["startup"].get(key) for run in runs]
+        return distribution([v for v in values if v is not None])
+
+    results = {
+        "server": args.server,
+        "warmup": runs[0]["startup"].get("warmup") if runs else None,
+        "healthReady": distribution([run["health"] for run in runs]),
+        "appReady": measure("readySeconds"),
+        "interpreter": measure("interpreterSeconds"),
+        "imports": measure("importSeconds"),
+        "init": measure("initSeconds"),
+        "phases": {phase["name"]: phase["seconds"] for phase in runs[-1]["startup"].get("phases", [])} if runs else {},
+    }
+    print(f"\nCold start ({args.server}, {args.runs} runs, warm-up {results['warmup']}), ms:")
+    for name in ("healthReady", "appReady", "interpreter", "imports", "init"):
+        d = results[name]
+        print(f"  {name:<12} p50 {d['p50']}  p95 {d['p95']}  max {d['max']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    p95 = results["healthReady"]["p95"]
+    if args.budget is not None and p95 is not None and p95 > args.budget * 1000:
+        print(f"\nOver budget: p95 {p95} ms > {args.budget * 1000:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
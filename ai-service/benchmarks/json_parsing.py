@@ -0,0 +1,223 @@
+"""Benchmark: tolerant single-pass blog JSON parsing vs the previous multi-attempt strategy.
+
+Runs both parsers over a corpus of model responses and reports, per defect
+kind, how many were recovered, how many came back exactly as written (where
+that is knowable), how many sections came back and the time per document.
+The built-in corpus is generated from a fixed seed and covers the defects
+seen in OpenRouter output; real responses can be added with --corpus (a
+directory of .txt files, one raw response each).
+
+    python benchmarks/json_parsing.py [--docs 40] [--repeat 5] [--corpus DIR] [--save-corpus DIR]
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_json import parse_tolerant  # noqa: E402
+
+WORDS = ("video transcript blog summary creator audience growth channel editing workflow "
+         "camera lighting thumbnail script story data insight strategy launch feedback").split()
+
+
+def legacy_parse_blog_json(content: str):
+    """The strategy parse_blog_json used before the tolerant parser, kept for comparison."""
+    content = content.replace('\\"', '"').replace("\\'", "'")
+    content = re.sub(r'\\(?!["\\/bfnrtu])', '', content)
+    json_start = content.find('{')
+    json_end = content.rfind('}') + 1
+    if json_start >= 0 and json_end > json_start:
+        json_str = content[json_start:json_end]
+        parse_attempts = [
+            lambda s: json.loads(s),
+            lambda s: json.loads(re.sub(r'[\x00-\x1f\x7f-\x9f]', '', s)),
+            lambda s: json.loads(s.replace('\\n', ' ').replace('\\t', ' ')),
+            lambda s: json.loads(re.sub(r',\s*}', '}', re.sub(r',\s*]', ']', s))),
+        ]
+        for parse_fn in parse_attempts:
+            try:
+                return parse_fn(json_str)
+            except json.JSONDecodeError:
+                continue
+    return None
+
+
+def tolerant_parse_blog_json(content: str):
+    blog_data, parser = parse_tolerant(content)
+    if not isinstance(blog_data, dict) or (parser.truncated and not blog_data.get('sections')):
+        return None
+    return blog_data
+
+
+PARSERS = {"legacy": legacy_parse_blog_json, "tolerant": tolerant_parse_blog_json}
+
+
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+
+def _sentence(rng: random.Random) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 18))).capitalize() + '.'
+
+
+def _blog(rng: random.Random) -> dict:
+    sections = []
+    for _ in range(rng.randint(3, 8)):
+        paragraphs = ['**Note:** ' + ' '.join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+                      for _ in range(rng.randint(2, 4))]
+        sections.append({"heading": _sentence(rng)[:60], "content": '\n\n'.join(paragraphs)})
+    return {
+        "title": _sentence(rng)[:70],
+        "sections": sections,
+        "seo": {"title": _sentence(rng)[:60], "metaDescription": _sentence(rng),
+                "keywords": rng.sample(WORDS, 5), "seoScore": rng.randint(60, 95),
+                "readabilityScore": "Good"},
+        "imageSuggestions": [_sentence(rng) for _ in range(2)],
+    }
+
+
+def _raw_newlines(text: str) -> str:
+    return text.replace('\\n', '\n')
+
+
+def _trailing_commas(text: str) -> str:
+    return re.sub(r'(["}\]\d])(\s*[}\]])', r'\1,\2', text)
+
+
+def _inner_quotes(text: str) -> str:
+    return text.replace('**Note:**', 'The host calls it \\"the "hook" moment\\" -', 1).replace(
+        '**Note:**', 'Keep it "simple"', 1)
+
+
+def _bad_escapes(text: str) -> str:
+    return text.replace('**Note:**', 'Use C:\\\\clips\\\\raw and \\$5 \\- \\.', 2)
+
+
+def _fenced(text: str) -> str:
+    return f"Here is the blog post you asked for:\n\n```json\n{text}\n```\nLet me know if you want changes."
+
+
+def _truncated(text: str, rng: random.Random) -> str:
+    return text[:int(len(text) * rng.uniform(0.55, 0.9))]
+
+
+def generate_corpus(docs: int, seed: int = 7) -> list:
+    """[(kind, text, expected)] with one document per kind and round.
+
+    expected is the original blog where a faithful repair should reproduce it
+    exactly, the number of sections where the text itself was altered, and
+    None for truncated output.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(docs):
+        blog = _blog(rng)
+        clean = json.dumps(blog, indent=2, ensure_ascii=False)
+        expected = len(blog["sections"])
+        corpus.append(("clean", clean, blog))
+        corpus.append(("fenced", _fenced(clean), blog))
+        corpus.append(("raw_newlines", _raw_newlines(clean), blog))
+        corpus.append(("trailing_commas", _trailing_commas(clean), blog))
+        corpus.append(("inner_quotes", _inner_quotes(clean), expected))
+        corpus.append(("bad_escapes", _bad_escapes(clean), expected))
+        corpus.append(("mixed", _fenced(_trailing_commas(_raw_newlines(_inner_quotes(clean)))), expected))
+        corpus.append(("truncated", _truncated(_raw_newlines(clean), rng), None))
+    return corpus
+
+
+def load_corpus(directory: str) -> list:
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.txt'):
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                corpus.append(("file", f.read(), None))
+    return corpus
+
+
+# ---------------------------------------------------------------------------
+# Run
+# ---------------------------------------------------------------------------
+
+def _usable(blog) -> bool:
+    return isinstance(blog, dict) and bool(blog.get('title')) and isinstance(blog.get('sections'), list) \
+        and bool(blog['sections'])
+
+
+def run(corpus: list, repeat: int) -> dict:
+    results = {}
+    for name, parse in PARSERS.items():
+        by_kind = defaultdict(lambda: {"docs": 0, "ok": 0, "exact": None, "sections": 0, "expected": 0,
+                                       "seconds": []})
+        for kind, text, expected in corpus:
+            row = by_kind[kind]
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                blog = parse(text)
+                timings.append(time.perf_counter() - start)
+            row["docs"] += 1
+            row["seconds"].append(min(timings))
+            if _usable(blog):
+                row["ok"] += 1
+                row["sections"] += len(blog["sections"])
+            if isinstance(expected, dict):
+                row["exact"] = (row["exact"] or 0) + (blog == expected)
+                expected = len(expected["sections"])
+            row["expected"] += expected or 0
+        results[name] = by_kind
+    return results
+
+
+def report(results: dict, corpus_size: int):
+    print(f"{corpus_size} documents\n")
+    print(f"{'kind':<16} {'parser':<9} {'success':>8} {'exact':>6} {'sections':>10} {'mean ms':>9} {'p95 ms':>8}")
+    kinds = list(next(iter(results.values())).keys())
+    for kind in kinds:
+        for name in PARSERS:
+            row = results[name][kind]
+            seconds = sorted(row["seconds"])
+            p95 = seconds[min(len(seconds) - 1, int(0.95 * len(seconds)))]
+            sections = f"{row['sections']}/{row['expected']}" if row["expected"] else str(row["sections"])
+            exact = '-' if row["exact"] is None else f"{row['exact'] / row['docs']:.0%}"
+            print(f"{kind:<16} {name:<9} {row['ok'] / row['docs']:>8.0%} {exact:>6} {sections:>10} "
+                  f"{1000 * sum(seconds) / len(seconds):>9.3f} {1000 * p95:>8.3f}")
+    print()
+    for name in PARSERS:
+        rows = results[name].values()
+        docs = sum(r["docs"] for r in rows)
+        ok = sum(r["ok"] for r in rows)
+        total = sum(sum(r["seconds"]) for r in rows)
+        print(f"{name:<9} overall success {ok}/{docs} ({ok / docs:.0%}), "
+              f"{1000 * total / docs:.3f} ms/doc")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--docs', type=int, default=40, help='generated documents per defect kind')
+    parser.add_argument('--repeat', type=int, default=5, help='timing repetitions per document (best is kept)')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--corpus', help='directory of raw model responses (*.txt) to include')
+    parser.add_argument('--save-corpus', help='write the generated corpus to this directory and exit')
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.docs, args.seed)
+    if args.save_corpus:
+        os.makedirs(args.save_corpus, exist_ok=True)
+        for i, (kind, text, _) in enumerate(corpus):
+            with open(os.path.join(args.save_corpus, f"{i:04d}-{kind}.txt"), 'w', encoding='utf-8') as f:
+                f.write(text)
+        print(f"Wrote {len(corpus)} documents to {args.save_corpus}")
+        return
+    if args.corpus:
+        corpus += load_corpus(args.corpus)
+    report(run(corpus, args.repeat), len(corpus))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,372 @@
+"""Load test: drive the Flask app against local provider stand-ins and record latency and throughput.
+
+Starts benchmarks/standins.py in a separate process and points the service
+at it (DEEPGRAM_API_URL, OPENROUTER_API_URL, and a caption strategy that
+fetches WebVTT from the stand-in), so the real upload, transcription,
+generation, parsing and caching code runs without touching a paid API.
+Each scenario sends --requests requests from --concurrency threads:
+
+    upload    POST /api/upload-video (multipart, --upload-kb per file)
+    stream    POST /api/upload-video/stream (raw body piped to Deepgram)
+    youtube   POST /api/process-youtube
+
+and reports throughput, p50/p95/p99 latency per endpoint and per stage (from
+the results' "timings" block), errors, and the peak RSS of this process (the
+stand-ins don't count towards it). Every run is saved as JSON under
+--results-dir; --compare prints the change against an earlier run and flags
+regressions beyond --threshold.
+
+    python benchmarks/load_test.py [--scenarios upload,youtube] [--requests 100] [--concurrency 8]
+        [--repeat-ratio 0.2] [--deepgram-latency lognormal:0.8:0.4] [--openrouter-error-rate 0.05]
+        [--label baseline] [--compare benchmarks/results/load-baseline-....json]
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, SERVICE_DIR)
+
+import standins  # noqa: E402
+
+SCENARIOS = ('upload', 'stream', 'youtube')
+# (metric, direction): +1 means higher is worse
+COMPARED = (('throughput', -1), ('p50', 1), ('p95', 1), ('p99', 1), ('errorRate', 1))
+
+
+def percentile(values: list, q: float) -> float:
+    """Linear-interpolated percentile of values (q in 0..100)."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def distribution(seconds: list) -> dict:
+    return {
+        "count": len(seconds),
+        "p50": _ms(percentile(seconds, 50)),
+        "p95": _ms(percentile(seconds, 95)),
+        "p99": _ms(percentile(seconds, 99)),
+        "max": _ms(max(seconds)) if seconds else None,
+    }
+
+
+def _ms(seconds) -> float:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def start_standins(profiles: dict):
+    """Run the stand-ins in their own process; returns (process, base URL)."""
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    process = context.Process(target=standins.serve, args=(0, profiles, ready), daemon=True)
+    process.start()
+    port = ready.get(timeout=30)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def configure_service(base_url: str, work_dir: str, args):
+    """Environment for importing main against the stand-ins; must run before the import."""
+    # Forced: never send benchmark traffic to a real provider
+    os.environ.update({
+        'DEEPGRAM_API_KEY': 'stand-in',
+        'OPENROUTER_API_KEY': 'stand-in',
+        'ASSEMBLYAI_API_KEY': '',
+        'TRANSCRIBE_PROVIDERS': 'deepgram',
+        'DEEPGRAM_API_URL': base_url,
+        'OPENROUTER_API_URL': f"{base_url}/api/v1",
+        'JOB_MODE_DEFAULT': 'sync',
+        # Cold caches (unless --cache-dir) and no writes into the service's own cache directory
+        'CACHE_DIR': args.cache_dir or os.path.join(work_dir, 'cache'),
+        'METRICS_DIR': os.path.join(work_dir, 'metrics'),
+        'TRACE_FILE': os.path.join(work_dir, 'traces', 'traces.jsonl'),
+        'JOB_STORE_PATH': os.path.join(work_dir, 'jobs.sqlite3'),
+    })
+    # Tunable from the environment; defaults keep runs comparable between machines
+    os.environ.setdefault('AUDIO_EXTRACTION', 'false')
+    os.environ.setdefault('HTTP_BACKOFF_BASE', '0.05')
+
+
+def install_caption_standin(base_url: str, pool_size: int):
+    """Replace the YouTube caption strategies with one that fetches WebVTT from the stand-in.
+
+    The race/chain logic, strategy stats, caches and VTT parsing still run;
+    only the third-party caption clients, which can't be pointed elsewhere, are bypassed.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    import youtube
+
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_maxsize=pool_size))
+
+    def fetch_with_standin(video_id: str, cancel: threading.Event, languages: list) -> dict:
+        try:
+            response = session.get(f"{base_url}/api/timedtext", params={'v': video_id}, timeout=60)
+        except requests.RequestException as e:
+            return {'success': False, 'text': None, 'error': f"caption stand-in failed: {e}"}
+        if response.status_code != 200:
+            return {'success': False, 'text': None, 'error': f"caption stand-in returned {response.status_code}"}
+        return {'success': True, 'text': youtube.parse_vtt(response.text), 'error': None, 'language': 'en',
+                'track': {'languageCode': 'en', 'source': 'stand-in'}}
+
+    youtube.STRATEGIES = [('stand-in', fetch_with_standin)]
+
+
+class Inputs:
+    """Request inputs for a scenario; --repeat-ratio of them reuse an earlier input (cache hits)."""
+
+    def __init__(self, scenario: str, args, rng: random.Random, run_id: str):
+        self.scenario = scenario
+        self.repeat_ratio = args.repeat_ratio
+        self.rng = rng
+        self.run_id = run_id
+        self.blob = rng.randbytes(args.upload_kb * 1024)
+        self.issued = []
+
+    def next(self, index: int):
+        if self.issued and self.rng.random() < self.repeat_ratio:
+            key = self.rng.choice(self.issued)
+        else:
+            key = f"{self.run_id}{index:06d}"
+            self.issued.append(key)
+        return key
+
+    def body(self, key: str) -> bytes:
+        # A distinct prefix per key gives each input its own content hash
+        return key.encode() + self.blob
+
+
+def send(client, scenario: str, inputs: Inputs, key: str, job_id: str):
+    headers = {'X-Trace-Id': job_id}
+    if scenario == 'upload':
+        return client.post('/api/upload-video', headers=headers, content_type='multipart/form-data',
+                           data={'video': (io.BytesIO(inputs.body(key)), 'load-test.mp4')})
+    if scenario == 'stream':
+        return client.post('/api/upload-video/stream', data=inputs.body(key), content_type='video/mp4',
+                           headers={**headers, 'X-Filename': 'load-test.mp4'})
+    # 11-character video IDs, as extract_youtube_video_id expects
+    return client.post('/api/process-youtube', headers=headers,
+                       json={'youtubeUrl': f"https://youtu.be/{key[-11:]:0>11}", 'jobId': job_id})
+
+
+def run_scenario(app, scenario: str, args, rng: random.Random, run_id: str) -> dict:
+    inputs = Inputs(scenario, args, rng, run_id)
+    keys = [inputs.next(i) for i in range(args.warmup + args.requests)]
+    local = threading.local()
+    samples = []
+    lock = threading.Lock()
+
+    def one(index: int, record: bool = True):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        job_id = f"load-{scenario}-{run_id}-{index}"
+        start = time.perf_counter()
+        response = send(client, scenario, inputs, keys[index], job_id)
+        seconds = time.perf_counter() - start
+        body = response.get_json(silent=True) or {}
+        sample = {"seconds": seconds, "status": response.status_code, "bytes": len(response.data),
+                  "degraded": bool(body.get('warnings')), "timings": body.get('timings') or {}}
+        if record:
+            with lock:
+                samples.append(sample)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(lambda i: one(i, record=False), range(args.warmup)))
+        start = time.perf_counter()
+        list(executor.map(one, range(args.warmup, args.warmup + args.requests)))
+        wall = time.perf_counter() - start
+
+    return summarize(samples, wall)
+
+
+def summarize(samples: list, wall: float) -> dict:
+    errors = sum(1 for s in samples if s["status"] >= 400)
+    stages = {}
+    cache_hits = 0
+    retries = 0
+    for s in samples:
+        timings = s["timings"]
+        for name, seconds in (timings.get("stages") or {}).items():
+            stages.setdefault(f"stage:{name}", []).append(seconds)
+        for name, call in (timings.get("calls") or {}).items():
+            stages.setdefault(f"call:{name}", []).append(call["seconds"])
+        cache_hits += len(timings.get("cacheHits") or [])
+        retries += timings.get("retries") or 0
+    return {
+        "requests": len(samples),
+        "seconds": round(wall, 3),
+        "throughput": round(len(samples) / wall, 3) if wall else None,
+        "errors": errors,
+        "errorRate": round(errors / len(samples), 4) if samples else None,
+        "degraded": sum(1 for s in samples if s["degraded"]),
+        "cacheHits": cache_hits,
+        "retries": retries,
+        "responseBytes": distribution([s["bytes"] / 1000 for s in samples])["p50"],
+        "latency": distribution([s["seconds"] for s in samples]),
+        "stages": {name: distribution(values) for name, values in sorted(stages.items())},
+    }
+
+
+def report(results: dict):
+    print(f"\n{'scenario':<10} {'req':>5} {'req/s':>8} {'err':>5} {'degr':>5} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'max ms':>9}")
+    for name, r in results["scenarios"].items():
+        lat = r["latency"]
+        print(f"{name:<10} {r['requests']:>5} {r['throughput']:>8.2f} {r['errors']:>5} {r['degraded']:>5} "
+              f"{lat['p50']:>9} {lat['p95']:>9} {lat['p99']:>9} {lat['max']:>9}")
+    for name, r in results["scenarios"].items():
+        print(f"\n{name}: stages (cache hits {r['cacheHits']}, retries {r['retries']})")
+        for stage, d in r["stages"].items():
+            print(f"  {stage:<26} {d['count']:>5} {d['p50']:>9} {d['p95']:>9} {d['p99']:>9} {d['max']:>9}")
+    print(f"\npeak RSS {results['peakRssMb']} MB; stand-in requests {results['standins']}")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Print per-metric changes against baseline; returns the regressions beyond threshold."""
+    regressions = []
+    print(f"\nCompared with {baseline.get('label')} ({baseline.get('createdAt')}):")
+    for name, r in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        for metric, direction in COMPARED:
+            new_value = r.get(metric) if metric in ('throughput', 'errorRate') else r["latency"].get(metric)
+            old_value = old.get(metric) if metric in ('throughput', 'errorRate') else old["latency"].get(metric)
+            if new_value is None or old_value is None:
+                continue
+            if old_value:
+                change = (new_value - old_value) / old_value
+            else:
+                change = 0.0 if new_value == old_value else float('inf')
+            worse = change * direction > threshold
+            if worse:
+                regressions.append(f"{name} {metric}")
+            print(f"  {name:<10} {metric:<10} {old_value:>10} -> {new_value:<10} {change:+.1%}"
+                  f"{'  REGRESSION' if worse else ''}")
+    peak, old_peak = results.get("peakRssMb"), baseline.get("peakRssMb")
+    if peak and old_peak:
+        change = (peak - old_peak) / old_peak
+        if change > threshold:
+            regressions.append("peak RSS")
+        print(f"  peak RSS   {old_peak} -> {peak} MB {change:+.1%}{'  REGRESSION' if change > threshold else ''}")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVICE_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', default='upload,youtube', help=f"comma-separated: {','.join(SCENARIOS)}")
+    parser.add_argument('--requests', type=int, default=100, help='measured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=4, help='unmeasured requests per scenario first')
+    parser.add_argument('--upload-kb', type=int, default=512, help='size of each uploaded file')
+    parser.add_argument('--repeat-ratio', type=float, default=0.0,
+                        help='fraction of requests that repeat an earlier input (exercises the caches)')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--cache-dir', help='reuse this cache directory instead of a fresh one (warm caches)')
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--results-dir', default=os.path.join(BENCH_DIR, 'results'))
+    parser.add_argument('--compare', help='earlier result file to compare with')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative change counted as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit 1 if --compare finds a regression')
+    parser.add_argument('--verbose', action='store_true', help="keep the service's log output")
+    standins.add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    profiles = standins.profiles_from_args(args)
+    process, base_url = start_standins(profiles)
+    work_dir = tempfile.mkdtemp(prefix='vdo-load-')
+    try:
+        configure_service(base_url, work_dir, args)
+        import logging
+        if not args.verbose:
+            logging.disable(logging.CRITICAL)
+        import main as service
+        install_caption_standin(base_url, args.concurrency)
+
+        rng = random.Random(args.seed)
+        run_id = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(5))
+        results = {
+            "label": args.label,
+            "createdAt": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "commit": git_commit(),
+            "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                            "cpus": os.cpu_count()},
+            "config": {"requests": args.requests, "concurrency": args.concurrency, "warmup": args.warmup,
+                       "uploadKb": args.upload_kb, "repeatRatio": args.repeat_ratio, "seed": args.seed,
+                       "profiles": {name: p.to_dict() for name, p in profiles.items()}},
+            "scenarios": {},
+        }
+        for scenario in scenarios:
+            print(f"Running {scenario}: {args.requests} requests at concurrency {args.concurrency}...")
+            results["scenarios"][scenario] = run_scenario(service.app, scenario, args, rng, run_id)
+        results["peakRssMb"] = peak_rss_mb()
+        try:
+            import requests
+            results["standins"] = requests.get(f"{base_url}/stats", timeout=5).json()
+        except Exception:
+            results["standins"] = None
+    finally:
+        process.terminate()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report(results)
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"load-{args.label}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"\nRegressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""Local HTTP stand-ins for the provider APIs, for load tests that must not hit paid services.
+
+Serves the endpoints the service calls, with the same request and response
+shapes:
+
+    POST /v1/listen                    Deepgram pre-recorded transcription
+    POST /api/v1/chat/completions      OpenRouter chat completions (plain and "stream": true)
+    GET  /api/timedtext?v=<id>         YouTube captions as WebVTT
+
+Each endpoint has a profile: a latency distribution, an error rate (errors
+are answered with a retryable status, as a rate-limited provider would) and
+a response size. Request bodies are read in full, chunked ones included, so
+upload time is part of the measurement as it would be against the real API.
+
+    python benchmarks/standins.py [--port 9100] [--deepgram-latency lognormal:0.8:0.4] ...
+
+then point the service at it with DEEPGRAM_API_URL=http://127.0.0.1:9100 and
+OPENROUTER_API_URL=http://127.0.0.1:9100/api/v1. benchmarks/load_test.py
+starts one itself.
+"""
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WORDS = ("video transcript blog summary creator audience growth channel editing workflow "
+         "camera lighting thumbnail script story data insight strategy launch feedback").split()
+
+
+class Profile:
+    """Latency distribution, error rate and response size of one stand-in endpoint.
+
+    latency is "fixed:S", "uniform:LOW:HIGH" or "lognormal:MEDIAN:SIGMA" (seconds).
+    """
+
+    def __init__(self, latency: str = 'fixed:0', error_rate: float = 0.0, size: int = 0,
+                 error_status: int = 503):
+        kind, *params = latency.split(':')
+        if kind not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {latency}")
+        self.latency = latency
+        self._kind = kind
+        self._params = [float(p) for p in params] or [0.0]
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.size = size
+
+    def delay(self, rng: random.Random) -> float:
+        if self._kind == 'uniform':
+            return rng.uniform(self._params[0], self._params[-1])
+        if self._kind == 'lognormal':
+            median = self._params[0]
+            sigma = self._params[1] if len(self._params) > 1 else 0.5
+            return median * math.exp(rng.gauss(0, sigma)) if median > 0 else 0.0
+        return self._params[0]
+
+    def fails(self, rng: random.Random) -> bool:
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+    def to_dict(self) -> dict:
+        return {"latency": self.latency, "errorRate": self.error_rate, "size": self.size,
+                "errorStatus": self.error_status}
+
+
+DEFAULT_PROFILES = {
+    # size: transcript words
+    'deepgram': Profile('lognormal:0.8:0.4', size=1500),
+    # size: blog sections
+    'openrouter': Profile('lognormal:2.0:0.4', size=5),
+    # size: caption cues
+    'captions': Profile('lognormal:0.3:0.5', size=400),
+}
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _blog_json(rng: random.Random, sections: int) -> str:
+    return json.dumps({
+        "title": _text(rng, 8).capitalize(),
+        "sections": [{"heading": _text(rng, 4).capitalize(), "content": _text(rng, 120)}
+                     for _ in range(max(1, sections))],
+        "seo": {"title": _text(rng, 8), "metaDescription": _text(rng, 25),
+                "keywords": rng.sample(WORDS, 5), "seoScore": 80, "readabilityScore": "Good"},
+    })
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'StandIn/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        if 'chunked' in (self.headers.get('Transfer-Encoding') or '').lower():
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    # Trailer section ends with an empty line
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return b''.join(parts)
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json', headers: dict = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _begin(self, name: str):
+        """Wait out the profile's latency; returns (profile, rng), or None after answering with an error."""
+        server = self.server
+        profile = server.profiles[name]
+        rng = random.Random()
+        server.count(name)
+        time.sleep(profile.delay(rng))
+        if profile.fails(rng):
+            server.count(name + 'Errors')
+            self._send(profile.error_status, json.dumps({"error": "stand-in injected error"}).encode(),
+                       headers={'Retry-After': '0'})
+            return None
+        return profile, rng
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._read_body()
+        if path.endswith('/v1/listen'):
+            self.server.count('deepgramBytes', len(body))
+            self._deepgram()
+        elif path.endswith('/chat/completions'):
+            try:
+                payload = json.loads(body or b'{}')
+            except ValueError:
+                payload = {}
+            self._openrouter(bool(payload.get('stream')))
+        else:
+            self._send(404, b'{"error": "not found"}')
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith('/timedtext'):
+            self._captions(parse_qs(url.query).get('v', [''])[0])
+        elif url.path == '/stats':
+            self._send(200, json.dumps(self.server.stats()).encode())
+        else:
+            self._send(404, b'{"error": "not found"}')
+
+    def _deepgram(self):
+        started = self._begin('deepgram')
+        if not started:
+            return
+        profile, rng = started
+        words = [{"word": rng.choice(WORDS), "start": i * 0.4, "end": i * 0.4 + 0.3}
+                 for i in range(max(1, profile.size))]
+        transcript = ' '.join(w["word"] for w in words)
+        self._send(200, json.dumps({
+            "metadata": {"duration": len(words) * 0.4},
+            "results": {"channels": [{"alternatives": [{"transcript": transcript, "words": words}]}]},
+        }).encode())
+
+    def _openrouter(self, stream: bool):
+        started = self._begin('openrouter')
+        if not started:
+            return
+        profile, rng = started
+        content = _blog_json(rng, profile.size)
+        if not stream:
+            self._send(200, json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]}).encode())
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        step = max(1, len(content) // 40)
+        for i in range(0, len(content), step):
+            delta = {"choices": [{"delta": {"content": content[i:i + step]}}]}
+            self.wfile.write(f"data: {json.dumps(delta)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _captions(self, video_id: str):
+        started = self._begin('captions')
+        if not started:
+            return
+        profile, rng = started
+        cues = ["WEBVTT", ""]
+        for i in range(max(1, profile.size)):
+            cues += [f"00:{i // 60 % 60:02d}:{i % 60:02d}.000 --> 00:{i // 60 % 60:02d}:{i % 60:02d}.900",
+                     _text(rng, 8), ""]
+        self._send(200, '\n'.join(cues).encode(), content_type='text/vtt')
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple, profiles: dict):
+        super().__init__(address, StandInHandler)
+        self.profiles = {**DEFAULT_PROFILES, **profiles}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def count(self, counter: str, n: int = 1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + n
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+
+def serve(port: int, profiles: dict, ready=None):
+    """Run the stand-ins until the process is stopped; ready (a queue) receives the bound port."""
+    server = StandInServer(('127.0.0.1', port), profiles)
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    for name, profile in DEFAULT_PROFILES.items():
+        parser.add_argument(f'--{name}-latency', default=profile.latency,
+                            help=f'{name} latency distribution (default {profile.latency})')
+        parser.add_argument(f'--{name}-error-rate', type=float, default=profile.error_rate,
+                            help=f'fraction of {name} requests answered with a retryable error')
+        parser.add_argument(f'--{name}-size', type=int, default=profile.size,
+                            help=f'{name} response size (default {profile.size})')
+
+
+def profiles_from_args(args) -> dict:
+    return {name: Profile(getattr(args, f'{name}_latency'), getattr(args, f'{name}_error_rate'),
+                          getattr(args, f'{name}_size'))
+            for name in DEFAULT_PROFILES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=9100)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    print(f"Stand-ins listening on http://127.0.0.1:{args.port}")
+    serve(args.port, profiles_from_args(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+"""Persistent on-disk caches for transcripts and other expensive pipeline results.
+
+Each entry is a small JSON file named after the SHA-256 of its key, so the
+cache directory can be shared by every gunicorn worker on the host. Writes go
+through a temp file + os.replace, and recency is tracked with the file mtime
+(touched on every hit), which gives LRU eviction without a shared index.
+Each process keeps a running size estimate from its own writes and scans
+the directory to evict only when that goes over a limit, or every
+CACHE_EVICT_INTERVAL seconds to catch up with the other workers' writes.
+An optional in-process LRU sits in front of the disk for hot keys.
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CACHE_ROOT = os.getenv('CACHE_DIR', os.path.join(os.path.dirname(__file__), 'cache'))
+CACHE_EVICT_INTERVAL = float(os.getenv('CACHE_EVICT_INTERVAL', 30))
+# Eviction goes down to this share of the limits, so a full cache isn't rescanned on every write
+_EVICT_TO = 0.9
+
+
+class DiskCache:
+    """JSON file cache with a TTL, LRU eviction by byte budget and/or entry count, and hit/miss counters.
+
+    memory_entries > 0 keeps that many recently used values in process memory
+    in front of the disk.
+    """
+
+    def __init__(self, name: str, directory: str, max_bytes: int = 0, ttl: int = 0,
+                 max_entries: int = 0, memory_entries: int = 0):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "memoryHits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0}
+        # (bytes, entries) at the last scan plus this process's writes since
+        self._usage = None
+        self._scanned_at = 0.0
+        # Created on the first write, so importing the module touches no disk
+        self._created = False
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _count(self, counter: str, n: int = 1):
+        with self._lock:
+            self._counters[counter] += n
+
+    def _remember(self, key: str, expires_at: float, value):
+        if not self.memory_entries:
+            return
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _expires_at(self, entry: dict) -> float:
+        if entry.get("expiresAt"):
+            return entry["expiresAt"]
+        if self.ttl:
+            return entry.get("createdAt", 0) + self.ttl
+        return 0
+
+    def get(self, key: str):
+        """Return the cached value for key, or None on a miss or expired entry."""
+        if self.memory_entries:
+            with self._lock:
+                item = self._memory.get(key)
+                if item and (not item[0] or item[0] > time.time()):
+                    self._memory.move_to_end(key)
+                    self._counters["hits"] += 1
+                    self._counters["memoryHits"] += 1
+                    return item[1]
+                if item:
+                    del self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._count("misses")
+            return None
+
+        if entry.get("key") != key:
+            self._count("misses")
+            return None
+
+        expires_at = self._expires_at(entry)
+        if expires_at and time.time() > expires_at:
+            self._count("expired")
+            self._count("misses")
+            self._remove(path)
+            return None
+
+        # Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self._count("hits")
+        self._remember(key, expires_at, entry.get("value"))
+        return entry.get("value")
+
+    def set(self, key: str, value, ttl: int = None):
+        """Store a JSON-serializable value under key and evict down to the cache limits.
+
+        ttl overrides the cache-wide TTL for this entry (e.g. short-lived negative results).
+        """
+        now = time.time()
+        entry = {"key": key, "createdAt": now, "value": value}
+        if ttl is not None:
+            entry["expiresAt"] = now + ttl
+        self._remember(key, self._expires_at(entry), value)
+        path = self._path(key)
+        tmp_path = None
+        try:
+            data = json.dumps(entry)
+            if not self._created:
+                os.makedirs(self.directory, exist_ok=True)
+                self._created = True
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+            try:
+                replaced = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced = None
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"{self.name} cache write failed: {e}")
+            if tmp_path:
+                self._remove(tmp_path)
+            return
+        self._count("stores")
+        # json.dumps escapes non-ASCII, so characters are bytes
+        self._maybe_evict(len(data) - (replaced or 0), 0 if replaced is not None else 1)
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _entries(self) -> list:
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    if not item.name.endswith('.json'):
+                        continue
+                    try:
+                        stat = item.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+        except FileNotFoundError:
+            # Nothing has been written yet
+            pass
+        return entries
+
+    def _over_limit(self, total_bytes: int, count: int, share: float = 1.0) -> bool:
+        return bool((self.max_bytes and total_bytes > self.max_bytes * share) or
+                    (self.max_entries and count > self.max_entries * share))
+
+    def _maybe_evict(self, added_bytes: int, added_entries: int):
+        if not self.max_bytes and not self.max_entries:
+            return
+        now = time.time()
+        with self._lock:
+            if self._usage is not None:
+                self._usage = (self._usage[0] + added_bytes, self._usage[1] + added_entries)
+                if now - self._scanned_at < CACHE_EVICT_INTERVAL and not self._over_limit(*self._usage):
+                    return
+            self._scanned_at = now
+        self._evict()
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        if self._over_limit(total, count):
+            # Oldest access first
+            entries.sort()
+            evicted = 0
+            for _, size, path in entries:
+                if not self._over_limit(total, count, _EVICT_TO):
+                    break
+                self._remove(path)
+                total -= size
+                count -= 1
+                evicted += 1
+            self._count("evictions", evicted)
+            logger.info(f"{self.name} cache evicted {evicted} entries")
+        with self._lock:
+            self._usage = (total, count)
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "hitRate": round(counters["hits"] / lookups, 3) if lookups else None,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "maxBytes": self.max_bytes,
+            "maxEntries": self.max_entries,
+            "memoryEntries": len(self._memory),
+            "ttl": self.ttl,
+        }
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file on disk."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_and_hash(stream, path: str, chunk_size: int = 1024 * 1024) -> tuple:
+    """Copy a readable stream to path, hashing it on the way through.
+
+    Returns: (bytes written, SHA-256 hex digest)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as out:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+class HashingReader:
+    """Read a stream chunk by chunk, hashing every byte and optionally teeing it to a spool file.
+
+    Iterating yields the chunks (e.g. as a chunked request body); drain() reads
+    whatever is left so the digest always covers the whole stream.
+    """
+
+    def __init__(self, stream, spool_path: str = None, chunk_size: int = 256 * 1024):
+        self.stream = stream
+        self.spool_path = spool_path
+        self.chunk_size = chunk_size
+        self.bytes = 0
+        self.finished = False
+        self._digest = hashlib.sha256()
+        self._spool = open(spool_path, 'wb') if spool_path else None
+
+    def read_chunk(self) -> bytes:
+        if self.finished:
+            return b''
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.finished = True
+            if self._spool:
+                self._spool.close()
+            return b''
+        self._digest.update(chunk)
+        self.bytes += len(chunk)
+        if self._spool:
+            self._spool.write(chunk)
+        return chunk
+
+    def __iter__(self):
+        while True:
+            chunk = self.read_chunk()
+            if not chunk:
+                return
+            yield chunk
+
+    def drain(self):
+        while self.read_chunk():
+            pass
+
+    def close(self):
+        if self._spool and not self._spool.closed:
+            self._spool.close()
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+# Transcripts of uploaded files, keyed by content digest + provider/model
+transcript_cache = DiskCache(
+    'transcript',
+    os.path.join(CACHE_ROOT, 'transcripts'),
+    max_bytes=int(os.getenv('TRANSCRIPT_CACHE_MAX_MB', 256)) * 1024 * 1024,
+    ttl=int(os.getenv('TRANSCRIPT_CACHE_TTL', 30 * 24 * 3600)),
+)
+
+
+def transcript_cache_key(content_hash: str, provider: str, model: str) -> str:
+    return f"upload:{content_hash}:{provider}:{model}"
+
+
+# Fetched YouTube transcripts (and "no captions" results), keyed by video ID + language
+youtube_cache = DiskCache(
+    'youtube',
+    os.path.join(CACHE_ROOT, 'youtube'),
+    max_bytes=int(os.getenv('YOUTUBE_CACHE_MAX_MB', 128)) * 1024 * 1024,
+    max_entries=int(os.getenv('YOUTUBE_CACHE_MAX_ENTRIES', 5000)),
+    ttl=int(os.getenv('YOUTUBE_CACHE_TTL', 7 * 24 * 3600)),
+    memory_entries=int(os.getenv('YOUTUBE_CACHE_MEMORY_ENTRIES', 256)),
+)
+YOUTUBE_NEGATIVE_TTL = int(os.getenv('YOUTUBE_NEGATIVE_TTL', 6 * 3600))
+
+
+def youtube_cache_key(video_id: str, language: str = 'auto') -> str:
+    return f"youtube:{video_id}:{language}"
+
+
+# Parsed blog dicts, keyed by transcript digest + template + prompt + model
+generation_cache = DiskCache(
+    'generation',
+    os.path.join(CACHE_ROOT, 'generation'),
+    max_bytes=int(os.getenv('GENERATION_CACHE_MAX_MB', 64)) * 1024 * 1024,
+    ttl=int(os.getenv('GENERATION_CACHE_TTL', 30 * 24 * 3600)),
+    memory_entries=int(os.getenv('GENERATION_CACHE_MEMORY_ENTRIES', 64)),
+)
+
+
+def generation_cache_key(transcript: str, template: str, prompt: str, model: str) -> str:
+    # Whitespace differences between fetches of the same transcript shouldn't miss
+    normalized = ' '.join(transcript.split())
+    transcript_digest = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+    prompt_digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+    return f"blog:{transcript_digest}:{template}:{prompt_digest}:{model}"
+
+
+# Results of batch-ingested videos, so re-running a playlist skips finished ones
+batch_cache = DiskCache(
+    'batch',
+    os.path.join(CACHE_ROOT, 'batch'),
+    max_bytes=int(os.getenv('BATCH_CACHE_MAX_MB', 128)) * 1024 * 1024,
+    ttl=int(os.getenv('BATCH_CACHE_TTL', 30 * 24 * 3600)),
+)
+
+
+def batch_cache_key(video_id: str, languages: list = None) -> str:
+    return f"batch:{video_id}:{','.join(languages) if languages else 'auto'}"
@@ -0,0 +1,256 @@
+"""Blog export formats: a registry of renderers, a rendered-output cache and ZIP bundles.
+
+Each format registers a renderer that works from a normalized view of the
+blog (title, sections and SEO fields are read once) and fills precompiled
+templates. Rendered output is cached in memory by a digest of the blog
+content and format; the same digest is the ETag, so a client that sends
+If-None-Match for an unchanged blog gets a 304 without anything being
+rendered. Several formats can be rendered in one call or streamed as a ZIP.
+"""
+import os
+import json
+import hashlib
+import zipfile
+import threading
+import logging
+from html import escape
+from string import Template
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CACHE_ENTRIES = int(os.getenv('EXPORT_CACHE_ENTRIES', 512))
+
+# Bump when a renderer's output changes so cached output and ETags are invalidated
+EXPORT_VERSION = '2'
+
+
+class ExportFormat:
+    """A registered export: render(view) -> str, plus how it is served."""
+
+    def __init__(self, name: str, extension: str, mimetype: str, render, json_content: bool = False):
+        self.name = name
+        self.extension = extension
+        self.mimetype = mimetype
+        self.render = render
+        # Rendered as JSON text; the single-format API returns it as an object
+        self.json_content = json_content
+
+
+EXPORT_FORMATS = OrderedDict()
+
+
+def register_format(name: str, extension: str, mimetype: str, json_content: bool = False):
+    """Decorator adding a renderer to EXPORT_FORMATS under name."""
+    def decorator(render):
+        EXPORT_FORMATS[name] = ExportFormat(name, extension, mimetype, render, json_content)
+        return render
+    return decorator
+
+
+class BlogView:
+    """The fields every renderer needs, read once from the blog dict."""
+
+    def __init__(self, blog_data: dict):
+        seo = blog_data.get('seo') or {}
+        self.title = blog_data.get('title', 'Untitled')
+        self.sections = [(s.get('heading', 'Section'), s.get('content', ''))
+                         for s in blog_data.get('sections', [])]
+        self.seo_title = seo.get('title', '')
+        self.meta_description = seo.get('metaDescription', '')
+        self.keywords = seo.get('keywords') or []
+
+
+# ---------------------------------------------------------------------------
+# Renderers
+# ---------------------------------------------------------------------------
+
+_MARKDOWN_SECTION = Template("## $heading\n\n$content\n\n")
+_MARKDOWN_FOOTER = Template("---\n\n**SEO Title:** $seo_title\n\n**Meta Description:** $description\n\n"
+                            "**Keywords:** $keywords\n")
+
+_HTML_PAGE = Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <meta name="description" content="$description">
+    <meta name="keywords" content="$keywords">
+    <title>$page_title</title>
+    <style>
+        body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; line-height: 1.8; max-width: 800px; margin: 0 auto; padding: 20px; background: #f5f5f5; }
+        article { background: white; padding: 40px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
+        h1 { color: #1a1a2e; border-bottom: 3px solid #4361ee; padding-bottom: 10px; }
+        h2 { color: #16213e; margin-top: 30px; }
+        p { color: #333; }
+    </style>
+</head>
+<body>
+    <article>
+        <h1>$title</h1>
+$sections    </article>
+</body>
+</html>""")
+_HTML_SECTION = Template("""        <section>
+            <h2>$heading</h2>
+            <p>$content</p>
+        </section>
+""")
+_WORDPRESS_SECTION = Template("<h2>$heading</h2>\n<p>$content</p>")
+
+
+@register_format('markdown', '.md', 'text/markdown')
+def export_to_markdown(view: BlogView) -> str:
+    """Convert blog data to Markdown format."""
+    parts = [f"# {view.title}\n\n"]
+    parts.extend(_MARKDOWN_SECTION.substitute(heading=heading, content=content)
+                 for heading, content in view.sections)
+    parts.append(_MARKDOWN_FOOTER.substitute(seo_title=view.seo_title, description=view.meta_description,
+                                             keywords=', '.join(view.keywords)))
+    return ''.join(parts)
+
+
+@register_format('html', '.html', 'text/html')
+def export_to_html(view: BlogView) -> str:
+    """Convert blog data to HTML format."""
+    sections = ''.join(_HTML_SECTION.substitute(heading=escape(heading), content=escape(content))
+                       for heading, content in view.sections)
+    return _HTML_PAGE.substitute(
+        description=escape(view.meta_description),
+        keywords=escape(', '.join(view.keywords)),
+        page_title=escape(view.seo_title or view.title or 'Blog Post'),
+        title=escape(view.title),
+        sections=sections,
+    )
+
+
+@register_format('wordpress', '.json', 'application/json', json_content=True)
+def export_to_wordpress(view: BlogView) -> str:
+    """Convert blog data to WordPress-compatible format."""
+    return json.dumps({
+        "post_title": view.title,
+        "post_content": "\n\n".join(_WORDPRESS_SECTION.substitute(heading=escape(heading), content=escape(content))
+                                    for heading, content in view.sections),
+        "post_excerpt": view.meta_description,
+        "post_status": "draft",
+        "meta": {
+            "yoast_wpseo_title": view.seo_title,
+            "yoast_wpseo_metadesc": view.meta_description,
+            "yoast_wpseo_focuskw": view.keywords[0] if view.keywords else ''
+        },
+        "tags": view.keywords
+    }, ensure_ascii=False, indent=2)
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+class ExportEngine:
+    """Renders registered formats with an LRU of rendered output keyed by content digest."""
+
+    def __init__(self, formats: OrderedDict, max_entries: int = EXPORT_CACHE_ENTRIES):
+        self.formats = formats
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"renders": 0, "hits": 0, "notModified": 0, "zips": 0}
+
+    def count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def resolve(self, requested) -> list:
+        """Format names from "markdown", "markdown,html", ["markdown", "html"] or "all".
+
+        Raises KeyError for an unknown format.
+        """
+        if not requested or requested == 'all':
+            return list(self.formats)
+        if isinstance(requested, str):
+            requested = requested.split(',')
+        names = []
+        for name in requested:
+            name = str(name).strip().lower()
+            if name not in self.formats:
+                raise KeyError(name)
+            if name not in names:
+                names.append(name)
+        return names
+
+    def blog_digest(self, blog_data: dict) -> str:
+        canonical = json.dumps(blog_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def etag(self, digest: str, names: list, variant: str = '') -> str:
+        key = f"{EXPORT_VERSION}:{digest}:{','.join(names)}:{variant}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+    def render(self, blog_data: dict, names: list, digest: str = None) -> OrderedDict:
+        """Rendered text for each format name, from the cache where possible."""
+        digest = digest or self.blog_digest(blog_data)
+        view = None
+        rendered = OrderedDict()
+        for name in names:
+            key = f"{EXPORT_VERSION}:{digest}:{name}"
+            with self._lock:
+                text = self._cache.get(key)
+                if text is not None:
+                    self._cache.move_to_end(key)
+                    self._counters["hits"] += 1
+            if text is None:
+                view = view or BlogView(blog_data)
+                text = self.formats[name].render(view)
+                with self._lock:
+                    self._counters["renders"] += 1
+                    self._cache[key] = text
+                    while len(self._cache) > self.max_entries:
+                        self._cache.popitem(last=False)
+            rendered[name] = text
+        return rendered
+
+    def zip_stream(self, rendered: OrderedDict, basename: str):
+        """Yield a ZIP of the rendered formats chunk by chunk, one file at a time."""
+        self.count("zips")
+        sink = _ChunkSink()
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, text in rendered.items():
+                # Fixed timestamps keep the archive byte-identical for the same blog (strong ETag)
+                info = zipfile.ZipInfo(basename + self.formats[name].extension, date_time=(2000, 1, 1, 0, 0, 0))
+                info.compress_type = zipfile.ZIP_DEFLATED
+                archive.writestr(info, text.encode('utf-8'))
+                yield sink.take()
+        yield sink.take()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counters, "entries": len(self._cache), "maxEntries": self.max_entries,
+                    "formats": list(self.formats)}
+
+
+class _ChunkSink:
+    """Write-only file object for zipfile that hands written bytes out as chunks."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def download_name(title: str) -> str:
+    """File name stem for downloads, from the blog title."""
+    stem = ''.join(c if c.isalnum() or c in ' -_' else '' for c in (title or ''))[:40].strip()
+    return stem.replace(' ', '-') or 'blog'
+
+
+export_engine = ExportEngine(EXPORT_FORMATS)
@@ -0,0 +1,43 @@
+"""gunicorn settings for the AI service, picked up from this directory:
+
+    cd ai-service && gunicorn main:app --workers 4 --threads 8
+    cd ai-service && gunicorn -k uvicorn.workers.UvicornWorker --workers 4 asgi:app
+
+With GUNICORN_PRELOAD (the default) the master imports main once, with
+STARTUP_WARMUP=eager so the provider modules are loaded too, and workers
+fork from it: a new worker is ready as soon as it has forked, instead of
+paying the imports itself. Everything that owns threads, event loops or
+subprocesses (job queue, metrics flusher, asyncio loop, yt-dlp helpers)
+starts in the worker on first use; post_fork drops the pooled provider
+connections the master may hold. Set GUNICORN_PRELOAD=false to have every
+worker import the app itself (e.g. to pick up code changes on HUP).
+"""
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+if preload_app:
+    os.environ.setdefault('STARTUP_WARMUP', 'eager')
+
+
+def on_starting(server):
+    # Worker metrics files left by a previous run would be merged into this run's totals
+    import metrics
+    metrics.registry.reset()
+
+
+def when_ready(server):
+    main = sys.modules.get('main')
+    if main is not None:
+        report = main.startup_report.stats()
+        server.log.info(f"App preloaded in {report['readySeconds']}s "
+                        f"(imports {report['importSeconds']}s, init {report['initSeconds']}s)")
+
+
+def post_fork(server, worker):
+    # Only a preloaded app has state inherited from the master
+    main = sys.modules.get('main')
+    if main is not None:
+        main.after_fork()
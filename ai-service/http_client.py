@@ -0,0 +1,206 @@
+"""Pooled, retrying HTTP clients for the outbound provider APIs.
+
+A ProviderClient is one keep-alive requests.Session per provider with a
+connection pool sized to the calls it serves at once (pool_size()), separate connect/read
+timeouts, and bounded exponential backoff with jitter that honours
+Retry-After. The pipelines call providers through aio_http's asyncio
+clients, which share the retry policy defined here; the synchronous client
+serves calls made on a request thread (the streamed upload's Deepgram call).
+"""
+import os
+import time
+import random
+import threading
+import logging
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+from jobs import STAGE_CONCURRENCY
+from metrics import upstream_bytes, upstream_requests
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 10))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', 1.0))
+HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', 30.0))
+
+RETRY_STATUSES = frozenset([408, 429, 500, 502, 503, 504])
+
+# Most idle connections kept per provider, however large the fan-out
+HTTP_POOL_MAX = int(os.getenv('HTTP_POOL_MAX', 128))
+
+
+def pool_size(callers: int, fan_out: int = 1) -> int:
+    """Connections a provider pool keeps: callers that can each have fan_out calls in flight, capped."""
+    return max(1, min(callers * max(1, fan_out), HTTP_POOL_MAX))
+
+
+def retry_delay(attempt: int, retry_after: str = None, base: float = HTTP_BACKOFF_BASE,
+                cap: float = HTTP_BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After if it asks for longer."""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after:
+        try:
+            wait = float(retry_after)
+        except ValueError:
+            try:
+                wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                wait = 0
+        delay = max(delay, min(wait, cap))
+    return delay
+
+
+def status_outcome(status: int) -> str:
+    """Outcome label of a provider response for upstream_requests."""
+    return 'ok' if status < 400 else 'rate_limited' if status == 429 else f"http_{status // 100}xx"
+
+
+class ProviderClient:
+    """Keep-alive session for one provider with retries and connection reuse counters."""
+
+    def __init__(self, name: str, pool_size: int, read_timeout: float,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT, max_retries: int = HTTP_MAX_RETRIES,
+                 backoff_base: float = HTTP_BACKOFF_BASE, backoff_max: float = HTTP_BACKOFF_MAX):
+        self.name = name
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "retries": 0, "failures": 0}
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _retry_delay(self, attempt: int, response: requests.Response = None) -> float:
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        return retry_delay(attempt, retry_after, self.backoff_base, self.backoff_max)
+
+    def request(self, method: str, url: str, read_timeout: float = None, **kwargs) -> requests.Response:
+        """Send a request, retrying connection errors and retryable statuses.
+
+        File-like bodies are rewound before each retry; bodies that can't be
+        rewound (generators) are sent once.
+        """
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        body = kwargs.get('data')
+        start_pos = None
+        if hasattr(body, 'seek') and hasattr(body, 'tell'):
+            start_pos = body.tell()
+        can_retry = body is None or start_pos is not None or isinstance(body, (bytes, str, dict))
+        if body is not None and not can_retry and not hasattr(body, 'read'):
+            kwargs['data'] = body = _CountingIterator(body, self.name)
+
+        attempt = 0
+        while True:
+            if start_pos is not None:
+                body.seek(start_pos)
+            self._count("requests")
+            try:
+                with tracing.span(self.name, kind='http', method=method, attempt=attempt + 1) as attrs:
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+                    attrs["status"] = response.status_code
+            except (requests.ConnectionError, requests.Timeout) as e:
+                upstream_requests.inc(provider=self.name,
+                                      outcome='timeout' if isinstance(e, requests.Timeout) else 'connection_error')
+                # A read timeout on a long upload is not worth repeating blindly
+                retryable = not isinstance(e, requests.ReadTimeout)
+                if not (can_retry and retryable and attempt < self.max_retries):
+                    self._count("failures")
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(f"{self.name} request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            else:
+                self._record_sent(response)
+                if response.status_code not in RETRY_STATUSES or not can_retry or attempt >= self.max_retries:
+                    if response.status_code >= 400:
+                        self._count("failures")
+                    return response
+                delay = self._retry_delay(attempt, response)
+                logger.warning(f"{self.name} returned {response.status_code}, retrying in {delay:.1f}s")
+                response.close()
+            self._count("retries")
+            tracing.event('retry', provider=self.name, attempt=attempt + 1, delay=round(delay, 2))
+            attempt += 1
+            time.sleep(delay)
+
+    def _record_sent(self, response: requests.Response):
+        upstream_requests.inc(provider=self.name, outcome=status_outcome(response.status_code))
+        # Streamed bodies are counted as they are read; sized ones carry Content-Length
+        length = response.request.headers.get('Content-Length')
+        if length and not isinstance(response.request.body, _CountingIterator):
+            upstream_bytes.inc(int(length), provider=self.name)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def connection_stats(self) -> dict:
+        """New vs reused connections, from the urllib3 pools behind the session."""
+        opened = served = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            served += pool.num_requests
+        return {"newConnections": opened, "reusedConnections": max(0, served - opened)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        return {**counters, **self.connection_stats(), "poolSize": self.pool_size}
+
+    def reset_connections(self):
+        """Drop pooled connections, e.g. ones inherited from the parent of a forked worker."""
+        self._adapter.poolmanager.clear()
+
+
+class _CountingIterator:
+    """Wraps a streamed request body to count the bytes actually sent."""
+
+    def __init__(self, body, provider: str):
+        self._body = iter(body)
+        self._provider = provider
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = next(self._body)
+        upstream_bytes.inc(len(chunk), provider=self._provider)
+        return chunk
+
+
+# Only streamed uploads use it, one call each inside a transcribe stage slot
+deepgram_client = ProviderClient(
+    'deepgram',
+    pool_size=pool_size(STAGE_CONCURRENCY['transcribe']),
+    read_timeout=float(os.getenv('DEEPGRAM_READ_TIMEOUT', 300)),
+)
+
+PROVIDER_CLIENTS = {client.name: client for client in (deepgram_client,)}
+
+
+def client_stats() -> dict:
+    return {name: client.stats() for name, client in PROVIDER_CLIENTS.items()}
+
+
+def reset_connections():
+    for client in PROVIDER_CLIENTS.values():
+        client.reset_connections()
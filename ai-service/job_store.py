@@ -0,0 +1,533 @@
+"""Durable record of every pipeline run, in a SQLite database shared by the workers.
+
+Each job's source, content hash, stage, timings, warnings and final result
+are kept in one row of JOB_STORE_PATH, so a result outlives the HTTP request
+that produced it: a client whose call timed out, or that was refreshed, can
+fetch it from GET /api/jobs/<jobId> on any worker, and GET /api/jobs lists
+jobs by status, kind and source.
+
+The database runs in WAL mode, so readers never block the writer and every
+gunicorn worker can open it. Writes never wait on the pipeline's thread (or
+the event loop): they are queued to one writer thread per process, which
+commits them in small batches and retries while another worker holds the
+write lock. Reads use a connection per thread.
+
+Retention: finished jobs older than JOB_STORE_COMPACT_AFTER keep their
+summary (title, timings, warnings, error) but drop the result payload;
+rows older than JOB_STORE_RETENTION, and the oldest beyond
+JOB_STORE_MAX_ROWS, are deleted. Jobs still marked running after
+JOB_STORE_STALE_AFTER (their worker died) are marked failed. One worker
+runs this every JOB_STORE_COMPACT_INTERVAL, then checkpoints the WAL and
+returns free pages to the filesystem.
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import inspect
+import threading
+import functools
+import contextvars
+import logging
+
+from cache import CACHE_ROOT
+
+logger = logging.getLogger(__name__)
+
+JOB_STORE_ENABLED = os.getenv('JOB_STORE_ENABLED', 'true').lower() == 'true'
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', os.path.join(CACHE_ROOT, 'jobs.sqlite3'))
+JOB_STORE_COMPACT_AFTER = int(os.getenv('JOB_STORE_COMPACT_AFTER', 7 * 24 * 3600))
+JOB_STORE_RETENTION = int(os.getenv('JOB_STORE_RETENTION', 90 * 24 * 3600))
+JOB_STORE_MAX_ROWS = int(os.getenv('JOB_STORE_MAX_ROWS', 100000))
+JOB_STORE_STALE_AFTER = int(os.getenv('JOB_STORE_STALE_AFTER', 2 * 3600))
+JOB_STORE_COMPACT_INTERVAL = int(os.getenv('JOB_STORE_COMPACT_INTERVAL', 3600))
+# How long a write or read waits for another worker's write lock
+JOB_STORE_BUSY_TIMEOUT = float(os.getenv('JOB_STORE_BUSY_TIMEOUT', 10))
+
+FINISHED = ('completed', 'failed', 'cancelled')
+LIST_MAX = 200
+# Rows changed per statement while compacting, so no worker waits long for the lock
+COMPACT_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id       TEXT PRIMARY KEY,
+    kind         TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    stage        TEXT,
+    source_key   TEXT,
+    content_hash TEXT,
+    title        TEXT,
+    created_at   REAL NOT NULL,
+    started_at   REAL,
+    updated_at   REAL NOT NULL,
+    finished_at  REAL,
+    timings      TEXT,
+    warnings     TEXT,
+    error        TEXT,
+    result       TEXT,
+    compacted    INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_source ON jobs (source_key, created_at);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key   TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flights (
+    flight_key TEXT PRIMARY KEY,
+    job_id     TEXT NOT NULL,
+    pid        INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    coalesced  INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_UPSERT_STARTED = """
+INSERT INTO jobs (job_id, kind, status, stage, created_at, started_at, updated_at)
+VALUES (?, ?, 'processing', 'started', ?, ?, ?)
+ON CONFLICT (job_id) DO UPDATE SET
+    status = 'processing', stage = 'started', started_at = excluded.started_at, updated_at = excluded.updated_at,
+    finished_at = NULL, error = NULL
+"""
+_UPSERT_QUEUED = """
+INSERT INTO jobs (job_id, kind, status, stage, created_at, updated_at)
+VALUES (?, ?, 'queued', 'queued', ?, ?)
+ON CONFLICT (job_id) DO UPDATE SET status = 'queued', stage = 'queued', updated_at = excluded.updated_at
+"""
+
+_current_job = contextvars.ContextVar('job_store_job', default=None)
+
+
+def source_key(video_id: str = None, content_hash: str = None, path: str = None) -> str:
+    """Normalized identity of a job's input: the YouTube video, else the file's SHA-256, else its path."""
+    if video_id:
+        return f"youtube:{video_id}"
+    if content_hash:
+        return f"sha256:{content_hash}"
+    if path:
+        return f"file:{os.path.abspath(path)}"
+    return None
+
+
+class JobStore:
+    """Jobs table in SQLite; write-behind from each process, readable from all of them."""
+
+    def __init__(self, path: str, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self._writes = queue.Queue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._ready = False
+        self._last_compaction_check = 0.0
+        self._counters = {"writes": 0, "batches": 0, "errors": 0, "busyRetries": 0, "compactions": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=JOB_STORE_BUSY_TIMEOUT, isolation_level=None,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(JOB_STORE_BUSY_TIMEOUT * 1000)}')
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection (connections are never shared across threads or a fork)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            self._ensure_schema()
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ensure_schema(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = self._connect()
+            try:
+                # Set before the first table exists; lets compaction hand pages back to the filesystem
+                conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(SCHEMA)
+            finally:
+                conn.close()
+            self._ready = True
+
+    def _ensure_writer(self):
+        # The writer thread belongs to the process doing the writes (fork safe)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._writes = queue.Queue()
+            self._pid = os.getpid()
+            threading.Thread(target=self._write_loop, name="job-store-writer", daemon=True).start()
+
+    def _write(self, sql: str, params: tuple):
+        if not self.enabled:
+            return
+        self._ensure_writer()
+        self._writes.put((sql, params))
+
+    def _write_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
+            for _ in batch:
+                self._writes.task_done()
+            self._maybe_compact()
+
+    def _commit(self, batch: list):
+        for attempt in range(3):
+            try:
+                conn = self._connection()
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    for sql, params in batch:
+                        conn.execute(sql, params)
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                with self._lock:
+                    self._counters["writes"] += len(batch)
+                    self._counters["batches"] += 1
+                return
+            except sqlite3.OperationalError as e:
+                # Another worker held the write lock past the busy timeout
+                if 'locked' in str(e) and attempt < 2:
+                    with self._lock:
+                        self._counters["busyRetries"] += 1
+                    continue
+                self._failed(e, len(batch))
+                return
+            except (sqlite3.Error, OSError) as e:
+                self._failed(e, len(batch))
+                return
+
+    def _failed(self, error: Exception, count: int):
+        with self._lock:
+            self._counters["errors"] += 1
+        logger.warning(f"Job store write failed, {count} update(s) lost: {error}")
+
+    def flush(self, timeout: float = 5.0):
+        """Wait (up to timeout) until this process's queued writes are committed."""
+        if self._pid != os.getpid():
+            return
+        deadline = time.time() + timeout
+        while self._writes.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def queued(self, job_id: str, kind: str):
+        now = time.time()
+        self._write(_UPSERT_QUEUED, (job_id, kind, now, now))
+
+    def started(self, job_id: str, kind: str):
+        now = time.time()
+        self._write(_UPSERT_STARTED, (job_id, kind, now, now, now))
+
+    def set_source(self, key: str, content_hash: str = None, job_id: str = None):
+        """Record the job's source key (see source_key()) and content hash (defaults to the running job)."""
+        job_id = job_id or _current_job.get()
+        if job_id and key:
+            self._write("UPDATE jobs SET source_key = ?, content_hash = COALESCE(?, content_hash), updated_at = ? "
+                        "WHERE job_id = ?", (key, content_hash, time.time(), job_id))
+
+    def set_stage(self, stage: str, job_id: str = None):
+        """Record the current stage of job_id (defaults to the running job; a no-op outside one)."""
+        job_id = job_id or _current_job.get()
+        if job_id:
+            self._write("UPDATE jobs SET stage = ?, updated_at = ? WHERE job_id = ?", (stage, time.time(), job_id))
+
+    def completed(self, job_id: str, result: dict):
+        now = time.time()
+        result = result if isinstance(result, dict) else {"result": result}
+        title = (result.get('seo') or {}).get('title')
+        self._write(
+            "UPDATE jobs SET status = 'completed', stage = 'completed', title = ?, timings = ?, warnings = ?, "
+            "result = ?, error = NULL, compacted = 0, finished_at = ?, updated_at = ? WHERE job_id = ?",
+            (title, _dumps(result.get('timings')), _dumps(result.get('warnings')), _dumps(result),
+             now, now, job_id))
+
+    def failed(self, job_id: str, error: str, status: str = 'failed'):
+        now = time.time()
+        self._write("UPDATE jobs SET status = ?, error = ?, finished_at = ?, updated_at = ? WHERE job_id = ?",
+                    (status, str(error)[:2000], now, now, job_id))
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        if not self.enabled:
+            return []
+        try:
+            return self._connection().execute(sql, params).fetchall()
+        except (sqlite3.Error, OSError) as e:
+            with self._lock:
+                self._counters["errors"] += 1
+            logger.warning(f"Job store read failed: {e}")
+            return []
+
+    def get(self, job_id: str, include_result: bool = True) -> dict:
+        """The stored record of job_id, or None."""
+        rows = self._query("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+        return _record(rows[0], include_result) if rows else None
+
+    def list(self, status: list = None, kind: str = None, source: str = None, since: float = None,
+             until: float = None, limit: int = 50, cursor: str = None) -> dict:
+        """Jobs newest first, filtered, one page at a time.
+
+        cursor is the nextCursor of the previous page ("<createdAt>:<jobId>"); pages
+        are keyed on the created_at index, so deep pages cost the same as the first.
+        """
+        clauses, params = [], []
+        if status:
+            clauses.append(f"status IN ({','.join('?' * len(status))})")
+            params.extend(status)
+        if kind:
+            clauses.append("kind = ?")
+            params.append(kind)
+        if source:
+            clauses.append("source_key = ?")
+            params.append(source)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if cursor:
+            created_at, _, job_id = cursor.partition(':')
+            clauses.append("(created_at < ? OR (created_at = ? AND job_id < ?))")
+            params.extend([float(created_at), float(created_at), job_id])
+        limit = max(1, min(int(limit), LIST_MAX))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._query(
+            f"SELECT job_id, kind, status, stage, source_key, content_hash, title, created_at, started_at, "
+            f"updated_at, finished_at, timings, warnings, error, compacted FROM jobs {where} "
+            f"ORDER BY created_at DESC, job_id DESC LIMIT ?", tuple(params) + (limit + 1,))
+        jobs = [_record(row, include_result=False) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = f"{last['created_at']!r}:{last['job_id']}"
+        return {"jobs": jobs, "nextCursor": next_cursor}
+
+    def _maybe_compact(self):
+        now = time.time()
+        if now - self._last_compaction_check < min(60, JOB_STORE_COMPACT_INTERVAL):
+            return
+        self._last_compaction_check = now
+        try:
+            conn = self._connection()
+            # Claim this round for one worker: only the UPDATE that moves the mark wins
+            conn.execute("INSERT OR IGNORE INTO store_meta (key, value) VALUES ('compacted_at', 0)")
+            claimed = conn.execute("UPDATE store_meta SET value = ? WHERE key = 'compacted_at' AND value <= ?",
+                                   (now, now - JOB_STORE_COMPACT_INTERVAL)).rowcount
+            if claimed:
+                self.compact(now)
+        except (sqlite3.Error, OSError) as e:
+            self._failed(e, 0)
+
+    def compact(self, now: float = None) -> dict:
+        """Apply the retention policy now; returns the number of rows touched per step."""
+        now = now or time.time()
+        conn = self._connection()
+        finished = ','.join(f"'{status}'" for status in FINISHED)
+        steps = {
+            "abandoned": ("UPDATE jobs SET status = 'failed', error = 'Abandoned: no update for too long (worker "
+                          "exited?)', finished_at = ?, updated_at = ? WHERE rowid IN (SELECT rowid FROM jobs "
+                          f"WHERE status NOT IN ({finished}) AND updated_at < ? LIMIT {COMPACT_BATCH})",
+                          (now, now, now - JOB_STORE_STALE_AFTER)),
+            "deleted": ("DELETE FROM jobs WHERE rowid IN (SELECT rowid FROM jobs WHERE created_at < ? "
+                        f"LIMIT {COMPACT_BATCH})", (now - JOB_STORE_RETENTION,)),
+            "compacted": ("UPDATE jobs SET result = NULL, compacted = 1 WHERE rowid IN (SELECT rowid FROM jobs "
+                          f"WHERE status IN ({finished}) AND compacted = 0 AND created_at < ? "
+                          f"LIMIT {COMPACT_BATCH})", (now - JOB_STORE_COMPACT_AFTER,)),
+        }
+        counts = {}
+        for name, (sql, params) in steps.items():
+            counts[name] = 0
+            while True:
+                changed = conn.execute(sql, params).rowcount
+                counts[name] += changed
+                if changed < COMPACT_BATCH:
+                    break
+        excess = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - JOB_STORE_MAX_ROWS
+        if excess > 0:
+            counts["deleted"] += conn.execute(
+                "DELETE FROM jobs WHERE rowid IN (SELECT rowid FROM jobs ORDER BY created_at LIMIT ?)",
+                (excess,)).rowcount
+        counts["flights"] = conn.execute("DELETE FROM flights WHERE started_at < ?",
+                                         (now - JOB_STORE_COMPACT_AFTER,)).rowcount
+        conn.execute('PRAGMA incremental_vacuum')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        with self._lock:
+            self._counters["compactions"] += 1
+        logger.info(f"✓ Job store compacted: {counts}")
+        return counts
+
+    def claim_flight(self, key: str, job_id: str, follow: bool = True, max_age: float = 900) -> tuple:
+        """Join or lead the flight for key, atomically across workers.
+
+        Returns (job ID, pid) of the running leader to wait for, or None if job_id
+        now leads the flight (none running, the leader finished or died, or
+        follow is False). Runs synchronously: the answer decides what the caller does.
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT f.job_id, f.pid, f.started_at, j.status FROM flights f "
+                "LEFT JOIN jobs j ON j.job_id = f.job_id WHERE f.flight_key = ?", (key,)).fetchone()
+            # A leader's row may not be written yet (writes are queued), so a missing one counts as running
+            if (follow and row is not None and row['job_id'] != job_id and row['started_at'] > now - max_age
+                    and row['status'] not in FINISHED and pid_alive(row['pid'])):
+                conn.execute("UPDATE flights SET coalesced = coalesced + 1 WHERE flight_key = ?", (key,))
+                conn.execute('COMMIT')
+                return row['job_id'], row['pid']
+            # A new leader keeps the key's coalesced count, so it adds up until compaction
+            conn.execute("INSERT INTO flights (flight_key, job_id, pid, started_at) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT (flight_key) DO UPDATE SET job_id = excluded.job_id, pid = excluded.pid, "
+                         "started_at = excluded.started_at", (key, job_id, os.getpid(), now))
+            conn.execute('COMMIT')
+            return None
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def job_states(self, job_ids: list) -> dict:
+        """{job_id: (status, result or None, error)} as committed, in one query; missing rows are left out."""
+        if not job_ids:
+            return {}
+        rows = self._query(f"SELECT job_id, status, result, error FROM jobs WHERE job_id IN "
+                           f"({','.join('?' * len(job_ids))})", tuple(job_ids))
+        return {row['job_id']: (row['status'], _loads(row['result']), row['error']) for row in rows}
+
+    def flight_stats(self) -> dict:
+        rows = self._query("SELECT COUNT(*) AS flights, COALESCE(SUM(coalesced), 0) AS coalesced, "
+                           "COALESCE(SUM(coalesced > 0), 0) AS shared FROM flights")
+        if not rows:
+            return {}
+        return {"flights": rows[0]['flights'], "sharedFlights": rows[0]['shared'],
+                "coalescedRequests": rows[0]['coalesced']}
+
+    def stats(self) -> dict:
+        counts = {row['status']: row['n'] for row in
+                  self._query("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "enabled": self.enabled,
+            "path": self.path,
+            "pendingWrites": self._writes.unfinished_tasks if self._pid == os.getpid() else 0,
+            "jobs": counts,
+            "sizeBytes": sum(os.path.getsize(p) for p in (self.path, self.path + '-wal') if os.path.exists(p)),
+        }
+
+
+def pid_alive(pid) -> bool:
+    """Whether process pid is running (workers sharing the database share the host)."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _dumps(value) -> str:
+    return json.dumps(value) if value is not None else None
+
+
+def _loads(value):
+    return json.loads(value) if value else None
+
+
+def _record(row: sqlite3.Row, include_result: bool) -> dict:
+    record = {
+        "jobId": row['job_id'],
+        "kind": row['kind'],
+        "status": row['status'],
+        "stage": row['stage'],
+        "sourceKey": row['source_key'],
+        "contentHash": row['content_hash'],
+        "title": row['title'],
+        "createdAt": row['created_at'],
+        "startedAt": row['started_at'],
+        "updatedAt": row['updated_at'],
+        "finishedAt": row['finished_at'],
+        "timings": _loads(row['timings']),
+        "warnings": _loads(row['warnings']),
+        "error": row['error'],
+        "compacted": bool(row['compacted']),
+    }
+    if include_result and row['status'] == 'completed' and not row['compacted']:
+        record["result"] = _loads(row['result'])
+    return {key: value for key, value in record.items() if value is not None}
+
+
+job_store = JobStore(JOB_STORE_PATH, JOB_STORE_ENABLED)
+atexit.register(job_store.flush)
+
+
+def stored_job(kind: str):
+    """Decorator recording fn(job_id, ...) in the job store: started, then its result or error.
+
+    A nested call for the job already running in this context (one pipeline
+    finishing another's work) is not recorded twice. Coroutine functions too.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(job_id, *args, **kwargs):
+                if _current_job.get() == job_id:
+                    return await fn(job_id, *args, **kwargs)
+                token = _current_job.set(job_id)
+                job_store.started(job_id, kind)
+                try:
+                    result = await fn(job_id, *args, **kwargs)
+                except Exception as e:
+                    job_store.failed(job_id, e)
+                    raise
+                except BaseException:
+                    # asyncio.CancelledError: the client went away (asgi.py)
+                    job_store.failed(job_id, "Cancelled", status='cancelled')
+                    raise
+                finally:
+                    _current_job.reset(token)
+                job_store.completed(job_id, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(job_id, *args, **kwargs):
+            if _current_job.get() == job_id:
+                return fn(job_id, *args, **kwargs)
+            token = _current_job.set(job_id)
+            job_store.started(job_id, kind)
+            try:
+                result = fn(job_id, *args, **kwargs)
+            except Exception as e:
+                job_store.failed(job_id, e)
+                raise
+            finally:
+                _current_job.reset(token)
+            job_store.completed(job_id, result)
+            return result
+        return wrapper
+    return decorator
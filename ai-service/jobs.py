@@ -0,0 +1,274 @@
+"""Background job queue and worker pool for the video-to-blog pipeline.
+
+Jobs are submitted by the request handlers and picked up by a bounded pool of
+worker threads, so a long transcription + generation run no longer pins a
+gunicorn worker for its full duration. A coroutine job runs on aio.event_loop
+while its worker waits for it; a job that parks (a single-flight follower
+waiting for an identical job) gives the worker back with release_worker() and
+is finished when the coroutine completes. Each job also keeps an ordered event
+log (stage changes, partial output, the final result) that clients can
+follow over server-sent events.
+"""
+import os
+import queue
+import inspect
+import threading
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+
+import tracing
+from job_store import job_store
+
+logger = logging.getLogger(__name__)
+
+# Queue / pool sizing (see .env.example)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_QUEUE_MAX = int(os.getenv('JOB_QUEUE_MAX', 32))
+JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 3600))
+
+# Per-stage slots for provider calls made on request threads (the streamed upload's Deepgram call);
+# the pipelines themselves run on aio.event_loop under AIO_STAGE_CONCURRENCY
+STAGE_CONCURRENCY = {
+    'transcribe': int(os.getenv('STAGE_CONCURRENCY_TRANSCRIBE', JOB_WORKERS)),
+    'generate': int(os.getenv('STAGE_CONCURRENCY_GENERATE', JOB_WORKERS)),
+}
+
+
+# The queued job a worker thread is running; copied into the pipeline coroutine it waits on
+_running_job = contextvars.ContextVar('running_job', default=None)
+# Set by a coroutine job to stop its worker waiting for it
+_release_worker = contextvars.ContextVar('release_worker', default=None)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobQueue:
+    """Bounded FIFO of pipeline jobs served by a fixed pool of worker threads."""
+
+    def __init__(self, workers: int, max_depth: int, stage_limits: dict, result_ttl: int = 3600):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.result_ttl = result_ttl
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._jobs = {}
+        self._events = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stage_limits = dict(stage_limits)
+        self._stage_semaphores = {
+            name: threading.BoundedSemaphore(max(1, limit)) for name, limit in stage_limits.items()
+        }
+        self._pid = None
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so (re)start the pool lazily in the
+        # process that actually serves requests (gunicorn preload safe).
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+            self._pid = os.getpid()
+            logger.info(f"✓ Job worker pool started ({self.workers} workers, queue depth {self.max_depth})")
+
+    def submit(self, job_id: str, kind: str, fn, *args, **kwargs) -> dict:
+        """Enqueue fn(*args, **kwargs) (a function or coroutine function) as job_id and return its initial record.
+
+        Raises QueueFullError if the queue is at capacity.
+        """
+        self._ensure_started()
+        now = time.time()
+        record = {
+            "jobId": job_id,
+            "kind": kind,
+            "status": "queued",
+            "stage": "queued",
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        with self._lock:
+            self._prune(now)
+            self._jobs[job_id] = record
+            self._events[job_id] = []
+            self._publish_locked(job_id, "stage", {"stage": "queued"})
+        try:
+            self._queue.put_nowait((job_id, fn, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._events.pop(job_id, None)
+            raise QueueFullError(f"Job queue is full ({self.max_depth} jobs pending)")
+        logger.info(f"✓ Job queued: {job_id} ({kind})")
+        return dict(record)
+
+    def get(self, job_id: str) -> dict:
+        """Return a snapshot of a job record, or None if unknown."""
+        with self._lock:
+            record = self._jobs.get(job_id)
+            return dict(record) if record else None
+
+    def release_worker(self):
+        """Let the worker waiting for the running coroutine job take the next one; a no-op elsewhere.
+
+        The job keeps running on the event loop and its record is completed when it finishes.
+        """
+        released = _release_worker.get()
+        if released is not None:
+            released.set()
+
+    def current_job(self) -> str:
+        """ID of the queued job running in this context (a worker, or its pipeline coroutine), or None."""
+        return _running_job.get()
+
+    def set_stage(self, stage: str, job_id: str = None):
+        """Record the current pipeline stage for job_id (defaults to the running job)."""
+        job_id = job_id or self.current_job()
+        if not job_id:
+            return
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record:
+                record["stage"] = stage
+                record["updatedAt"] = time.time()
+                self._publish_locked(job_id, "stage", {"stage": stage})
+
+    def publish(self, event: str, data: dict, job_id: str = None):
+        """Append an event to a job's log (defaults to the running job) and wake its listeners."""
+        job_id = job_id or self.current_job()
+        if not job_id:
+            return
+        with self._lock:
+            self._publish_locked(job_id, event, data)
+
+    def _publish_locked(self, job_id: str, event: str, data: dict):
+        events = self._events.get(job_id)
+        if events is None:
+            return
+        events.append((len(events) + 1, event, data))
+        self._changed.notify_all()
+
+    def wait_events(self, job_id: str, after: int = 0, timeout: float = 15.0) -> tuple:
+        """Block until job_id has events newer than `after`, it finishes, or timeout passes.
+
+        Returns: (events [(id, event, data), ...] or None if the job is unknown, finished)
+        """
+        deadline = time.time() + timeout
+        with self._lock:
+            while True:
+                record = self._jobs.get(job_id)
+                events = self._events.get(job_id)
+                if record is None or events is None:
+                    return None, True
+                finished = record["status"] in ("completed", "failed")
+                if len(events) > after or finished:
+                    return events[after:], finished
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return [], False
+                self._changed.wait(remaining)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Mark the running job as being in stage `name` and hold that stage's concurrency slot.
+
+        The stage is a span of the job's trace; time spent waiting for the slot is its waitSeconds.
+        """
+        self.set_stage(name)
+        job_store.set_stage(name)
+        semaphore = self._stage_semaphores.get(name)
+        with tracing.span(name) as attrs:
+            if semaphore is None:
+                yield
+                return
+            start = time.perf_counter()
+            with semaphore:
+                waited = time.perf_counter() - start
+                if waited >= 0.001:
+                    attrs["waitSeconds"] = round(waited, 3)
+                yield
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {}
+            for record in self._jobs.values():
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+        return {
+            "workers": self.workers,
+            "queueDepth": self._queue.qsize(),
+            "maxQueueDepth": self.max_depth,
+            "stageConcurrency": self._stage_limits,
+            "jobs": counts,
+        }
+
+    def _update(self, job_id: str, event: tuple = None, **fields):
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record:
+                record.update(fields)
+                record["updatedAt"] = time.time()
+                if event:
+                    self._publish_locked(job_id, *event)
+
+    def _prune(self, now: float):
+        expired = [
+            job_id for job_id, record in self._jobs.items()
+            if record["status"] in ("completed", "failed") and now - record["updatedAt"] > self.result_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._events.pop(job_id, None)
+
+    def _worker(self):
+        while True:
+            job_id, fn, args, kwargs = self._queue.get()
+            token = _running_job.set(job_id)
+            self._update(job_id, status="processing", stage="started", startedAt=time.time(),
+                         event=("stage", {"stage": "started"}))
+            try:
+                if inspect.iscoroutinefunction(fn):
+                    self._await(job_id, fn(*args, **kwargs))
+                else:
+                    self._finish(job_id, fn, args, kwargs)
+            finally:
+                _running_job.reset(token)
+                self._queue.task_done()
+
+    def _finish(self, job_id: str, fn, args: tuple = (), kwargs: dict = None):
+        """Record the outcome of fn(*args, **kwargs) as the job's result or error."""
+        try:
+            result = fn(*args, **(kwargs or {}))
+            self._update(job_id, status="completed", stage="completed", result=result,
+                         event=("result", result))
+            logger.info(f"✓ Job completed: {job_id}")
+        except Exception as e:
+            error_msg = f"Job failed: {str(e)}"
+            logger.error(f"{error_msg} (Job: {job_id})")
+            self._update(job_id, status="failed", error=error_msg,
+                         event=("error", {"jobId": job_id, "error": error_msg}))
+
+    def _await(self, job_id: str, coro):
+        """Run a coroutine job on the event loop, waiting for it unless it releases this worker first."""
+        from aio import event_loop
+
+        released = threading.Event()
+        token = _release_worker.set(released)
+        try:
+            future = event_loop.submit(coro)
+        finally:
+            _release_worker.reset(token)
+        future.add_done_callback(lambda _: released.set())
+        released.wait()
+        if not future.done():
+            logger.info(f"Job {job_id} released its worker while it waits")
+        # Runs now if the job is done, else on the loop when it finishes
+        future.add_done_callback(lambda done: self._finish(job_id, done.result))
+
+
+job_queue = JobQueue(JOB_WORKERS, JOB_QUEUE_MAX, STAGE_CONCURRENCY, JOB_RESULT_TTL)
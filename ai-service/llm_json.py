@@ -0,0 +1,284 @@
+"""Helpers for the JSON the model writes for blog generation."""
+import re
+import json
+
+_STRING_SPECIAL = re.compile(r'[\\"\x00-\x1f]')
+_STRUCTURE = re.compile(r'["{}\[\],]')
+_NEXT_TOKEN = re.compile(r'\s*(\S)')
+_HEX4 = re.compile(r'[0-9a-fA-F]{4}')
+_CONTROL_ESCAPES = {'\n': '\\n', '\r': '\\r', '\t': '\\t', '\b': '\\b', '\f': '\\f'}
+_VALID_ESCAPES = frozenset('"\\/bfnrt')
+_CLOSERS = {'{': '}', '[': ']'}
+
+# Containers at this depth or shallower are cut points for truncated output:
+# root members and the elements of top-level arrays such as "sections"
+_SAFE_DEPTH = 2
+
+
+class TolerantJSONParser:
+    """Single-pass repairing scanner for the JSON object in a model response.
+
+    Text is fed in as it arrives (all at once or streamed); one scan finds the
+    outermost object and rewrites the common defects on the way through:
+    raw newlines and other control characters inside strings, invalid
+    backslash escapes, quotes inside strings that aren't escaped, trailing
+    commas and mismatched closing brackets. If the output is truncated,
+    finish() cuts it back to the last complete root member or array element
+    (e.g. the last complete section) and closes what is still open.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.repairs = 0
+        self.truncated = False
+        self._pos = 0
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._pending_comma = False
+        self._out = []
+        self._stack = []
+        self._safe = None  # (len(self._out), depth) at the last cut point
+
+    def feed(self, text: str):
+        self.buffer += text
+        self._scan(final=False)
+
+    def finish(self):
+        """Scan what is left and return the parsed object, or None if nothing usable was found."""
+        self._scan(final=True)
+        if not self._started:
+            return None
+        if self._done:
+            text = ''.join(self._out)
+        else:
+            if self._safe is None:
+                return None
+            self.truncated = True
+            length, depth = self._safe
+            text = ''.join(self._out[:length]) + ''.join(_CLOSERS[c] for c in reversed(self._stack[:depth]))
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    def _emit(self, text: str):
+        if self._pending_comma:
+            self._out.append(',')
+            self._pending_comma = False
+        self._out.append(text)
+
+    def _mark_safe(self):
+        self._safe = (len(self._out), len(self._stack))
+
+    def _scan(self, final: bool):
+        buf = self.buffer
+        pos = self._pos
+        end = len(buf)
+        while pos < end and not self._done:
+            if not self._started:
+                start = buf.find('{', pos)
+                if start < 0:
+                    pos = end
+                    break
+                self._started = True
+                self._stack.append('{')
+                self._out.append('{')
+                self._mark_safe()
+                self._opened()
+                pos = start + 1
+                continue
+
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buf, pos)
+                if not match:
+                    self._out.append(buf[pos:])
+                    pos = end
+                    break
+                i = match.start()
+                if i > pos:
+                    self._out.append(buf[pos:i])
+                ch = buf[i]
+                if ch == '\\':
+                    if i + 1 >= end:
+                        if final:
+                            pos = end
+                            continue
+                        pos = i
+                        break
+                    nxt = buf[i + 1]
+                    if nxt == 'u':
+                        if i + 6 > end and not final:
+                            pos = i
+                            break
+                        if _HEX4.match(buf, i + 2):
+                            self._out.append(buf[i:i + 6])
+                            pos = i + 6
+                        else:
+                            self.repairs += 1
+                            pos = i + 1
+                    elif nxt in _VALID_ESCAPES:
+                        self._out.append(buf[i:i + 2])
+                        pos = i + 2
+                    else:
+                        # Invalid escape: keep the character, drop the backslash
+                        self.repairs += 1
+                        pos = i + 1
+                elif ch == '"':
+                    # A quote only ends the string if what follows can follow a string
+                    follow = _NEXT_TOKEN.match(buf, i + 1)
+                    if follow is None and not final:
+                        pos = i
+                        break
+                    if follow is None or follow.group(1) in ',:}]':
+                        self._out.append('"')
+                        self._in_string = False
+                        self._string_closed()
+                    else:
+                        self.repairs += 1
+                        self._out.append('\\"')
+                    pos = i + 1
+                else:
+                    self.repairs += 1
+                    self._out.append(_CONTROL_ESCAPES.get(ch, '\\u%04x' % ord(ch)))
+                    pos = i + 1
+                continue
+
+            match = _STRUCTURE.search(buf, pos)
+            segment = buf[pos:match.start() if match else end].strip()
+            if segment:
+                self._emit(segment)
+            if not match:
+                pos = end
+                break
+            ch = match.group()
+            pos = match.end()
+            if ch == '"':
+                self._emit('"')
+                self._in_string = True
+                self._string_opened()
+            elif ch in '{[':
+                self._emit(ch)
+                self._stack.append(ch)
+                if len(self._stack) <= _SAFE_DEPTH:
+                    self._mark_safe()
+                self._opened()
+            elif ch in '}]':
+                if self._pending_comma:
+                    self.repairs += 1
+                    self._pending_comma = False
+                if not self._stack:
+                    continue
+                closer = _CLOSERS[self._stack.pop()]
+                if closer != ch:
+                    self.repairs += 1
+                self._out.append(closer)
+                self._closed()
+                if not self._stack:
+                    self._done = True
+                elif len(self._stack) <= _SAFE_DEPTH:
+                    self._mark_safe()
+            else:  # ','
+                if self._pending_comma:
+                    self.repairs += 1
+                elif len(self._stack) <= _SAFE_DEPTH:
+                    self._mark_safe()
+                self._pending_comma = True
+                self._comma()
+        self._pos = pos
+
+    # Structure hooks, called with the repaired output up to the token in self._out
+    def _opened(self):
+        pass
+
+    def _closed(self):
+        pass
+
+    def _string_opened(self):
+        pass
+
+    def _string_closed(self):
+        pass
+
+    def _comma(self):
+        pass
+
+
+class IncrementalBlogParser(TolerantJSONParser):
+    """TolerantJSONParser that reports parts of a blog document as soon as they are complete.
+
+    feed() returns events for the top-level "title" string and for each
+    object in the top-level "sections" array once its closing brace arrives:
+    [('title', str), ('section', index, dict), ...]. Parts are decoded from
+    the repaired output, so they get the same fixes finish() applies to the
+    whole document.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.title = None
+        self._events = []
+        self._keys = []  # the current key of each open container (None in arrays)
+        self._expect_key = False
+        self._string_start = None
+        self._section_start = None
+        self._section_index = 0
+
+    def feed(self, text: str) -> list:
+        super().feed(text)
+        events, self._events = self._events, []
+        return events
+
+    def _opened(self):
+        self._keys.append(None)
+        self._expect_key = self._stack[-1] == '{'
+        # An element of root["sections"]
+        if len(self._stack) == 3 and self._expect_key and self._stack[1] == '[' and self._keys[0] == 'sections':
+            self._section_start = len(self._out) - 1
+
+    def _closed(self):
+        self._keys.pop()
+        self._expect_key = False
+        if self._section_start is not None and len(self._stack) == 2:
+            try:
+                self._events.append(('section', self._section_index,
+                                     json.loads(''.join(self._out[self._section_start:]))))
+                self._section_index += 1
+            except ValueError:
+                pass
+            self._section_start = None
+
+    def _string_opened(self):
+        self._string_start = len(self._out) - 1
+
+    def _string_closed(self):
+        if self._stack[-1] != '{':
+            return
+        if self._expect_key:
+            self._keys[-1] = json.loads(''.join(self._out[self._string_start:]))
+            self._expect_key = False
+        elif len(self._stack) == 1 and self._keys[0] == 'title' and self.title is None:
+            self.title = json.loads(''.join(self._out[self._string_start:]))
+            self._events.append(('title', self.title))
+
+    def _comma(self):
+        self._expect_key = bool(self._stack) and self._stack[-1] == '{'
+
+
+def parse_tolerant(text: str):
+    """Parse the outermost JSON object in text, repairing common defects.
+
+    Returns: (value or None, parser) so callers can inspect parser.repairs / parser.truncated
+    """
+    parser = TolerantJSONParser()
+    # Well-formed output (the common case) needs no repair scan
+    start, end = text.find('{'), text.rfind('}')
+    if 0 <= start < end:
+        try:
+            value = json.loads(text[start:end + 1])
+            if isinstance(value, dict):
+                return value, parser
+        except ValueError:
+            pass
+    parser.feed(text)
+    return parser.finish(), parser
@@ -0,0 +1,251 @@
+"""Local media pre-processing with ffmpeg.
+
+Transcription providers only need the speech, so uploads are demuxed and
+transcoded to compact mono Opus before being sent upstream, and long
+recordings can be split at silences into overlapping segments that are
+transcribed in parallel. Everything here falls back to the original file
+when ffmpeg is missing or fails. ffmpeg and ffprobe run as asyncio
+subprocesses, killed if the calling task is cancelled.
+"""
+import os
+import re
+import time
+import shutil
+import asyncio
+import tempfile
+import subprocess
+import logging
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTRACTION = os.getenv('AUDIO_EXTRACTION', 'true').lower() == 'true'
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+FFMPEG_TIMEOUT = int(os.getenv('FFMPEG_TIMEOUT', 300))
+AUDIO_SAMPLE_RATE = int(os.getenv('AUDIO_SAMPLE_RATE', 16000))
+AUDIO_BITRATE = os.getenv('AUDIO_BITRATE', '24k')
+
+AUDIO_CONTENT_TYPE = 'audio/ogg'
+
+# Chunked transcription of long recordings
+CHUNKED_TRANSCRIPTION = os.getenv('CHUNKED_TRANSCRIPTION', 'true').lower() == 'true'
+CHUNK_MIN_DURATION = float(os.getenv('CHUNK_MIN_DURATION', 900))
+CHUNK_SECONDS = float(os.getenv('CHUNK_SECONDS', 300))
+CHUNK_OVERLAP = float(os.getenv('CHUNK_OVERLAP', 2))
+CHUNK_PARALLELISM = int(os.getenv('CHUNK_PARALLELISM', 4))
+CHUNK_RETRIES = int(os.getenv('CHUNK_RETRIES', 2))
+# How far (as a fraction of CHUNK_SECONDS) a cut may move to land in a silence
+CHUNK_SNAP_WINDOW = float(os.getenv('CHUNK_SNAP_WINDOW', 0.15))
+
+_SILENCE_RE = re.compile(r'silence_(start|end): (-?[0-9.]+)')
+
+
+def find_ffmpeg() -> str:
+    """Path to the ffmpeg binary, or None if it isn't installed."""
+    return shutil.which(FFMPEG_PATH)
+
+
+async def _run(cmd: list, timeout: float) -> tuple:
+    """Run cmd as an asyncio subprocess and return (returncode, stdout, stderr) as text.
+
+    The process is killed when it outlives timeout (raising RuntimeError) or the calling task is cancelled.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        raise RuntimeError(f"{os.path.basename(cmd[0])} timed out after {timeout} seconds")
+    except BaseException:
+        process.kill()
+        raise
+    return (process.returncode, stdout.decode('utf-8', errors='replace'),
+            stderr.decode('utf-8', errors='replace'))
+
+
+async def extract_audio(video_path: str) -> dict:
+    """Transcode the audio track of video_path to 16 kHz mono Opus in a temp file.
+
+    The caller is responsible for removing the returned file.
+
+    Returns: {'success': bool, 'path': str or None, 'content_type': str, 'error': str or None,
+              'bytesIn': int, 'bytesOut': int, 'bytesSaved': int, 'seconds': float}
+    """
+    start = time.time()
+    stats, cmd, audio_path = _prepare_extraction(video_path)
+    if cmd is None:
+        return {'success': False, 'path': None, 'error': 'ffmpeg not found', **stats}
+    try:
+        returncode, _, stderr = await _run(cmd, FFMPEG_TIMEOUT)
+        _check_extraction(audio_path, returncode, stderr)
+    except Exception as e:
+        return _extraction_failed(audio_path, stats, start, e)
+    except BaseException:
+        _remove_quietly(audio_path)
+        raise
+    return _extraction_done(audio_path, stats, start)
+
+
+def _prepare_extraction(video_path: str) -> tuple:
+    """(stats, ffmpeg command, output path) for extracting video_path's audio; no command without ffmpeg."""
+    bytes_in = os.path.getsize(video_path)
+    stats = {'bytesIn': bytes_in, 'bytesOut': bytes_in, 'bytesSaved': 0, 'seconds': 0.0}
+
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        return stats, None, None
+
+    fd, audio_path = tempfile.mkstemp(suffix='.ogg', dir=os.path.dirname(video_path) or None)
+    os.close(fd)
+    cmd = [
+        ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', video_path,
+        '-vn', '-sn', '-dn',            # audio only
+        '-ac', '1', '-ar', str(AUDIO_SAMPLE_RATE),
+        '-c:a', 'libopus', '-b:a', AUDIO_BITRATE, '-application', 'voip',
+        audio_path
+    ]
+    return stats, cmd, audio_path
+
+
+def _check_extraction(audio_path: str, returncode: int, stderr: str):
+    if returncode != 0 or os.path.getsize(audio_path) == 0:
+        raise RuntimeError(stderr.strip()[:300] or f"ffmpeg exited with {returncode}")
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _extraction_failed(audio_path: str, stats: dict, start: float, error: Exception) -> dict:
+    _remove_quietly(audio_path)
+    stats['seconds'] = round(time.time() - start, 3)
+    return {'success': False, 'path': None, 'error': f"Audio extraction failed: {error}", **stats}
+
+
+def _extraction_done(audio_path: str, stats: dict, start: float) -> dict:
+    bytes_in = stats['bytesIn']
+    bytes_out = os.path.getsize(audio_path)
+    stats.update({
+        'bytesOut': bytes_out,
+        'bytesSaved': bytes_in - bytes_out,
+        'seconds': round(time.time() - start, 3),
+    })
+    logger.info(f"✓ Audio extracted: {bytes_in / (1024*1024):.2f} MB -> {bytes_out / (1024*1024):.2f} MB "
+                f"in {stats['seconds']:.2f}s")
+    return {'success': True, 'path': audio_path, 'content_type': AUDIO_CONTENT_TYPE, 'error': None, **stats}
+
+
+async def probe_duration(path: str) -> float:
+    """Duration of a media file in seconds (via ffprobe), or None if unknown."""
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        return None
+    ffprobe = shutil.which(os.path.join(os.path.dirname(ffmpeg), 'ffprobe')) or shutil.which('ffprobe')
+    if not ffprobe:
+        return None
+    try:
+        _, stdout, _ = await _run(
+            [ffprobe, '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', path], 60)
+        return float(stdout.strip())
+    except (ValueError, RuntimeError, OSError):
+        return None
+
+
+async def detect_silences(path: str, noise: str = '-30dB', min_silence: float = 0.4) -> list:
+    """Silent intervals in the audio as [(start, end), ...] using ffmpeg's silencedetect."""
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        return []
+    cmd = [ffmpeg, '-nostdin', '-hide_banner', '-i', path, '-vn',
+           '-af', f'silencedetect=noise={noise}:d={min_silence}', '-f', 'null', '-']
+    try:
+        _, _, stderr = await _run(cmd, FFMPEG_TIMEOUT)
+    except (RuntimeError, OSError) as e:
+        logger.warning(f"Silence detection failed: {e}")
+        return []
+
+    silences = []
+    start = None
+    for kind, value in _SILENCE_RE.findall(stderr):
+        if kind == 'start':
+            start = max(0.0, float(value))
+        elif start is not None:
+            silences.append((start, float(value)))
+            start = None
+    return silences
+
+
+def plan_segments(duration: float, silences: list, target: float = CHUNK_SECONDS,
+                  overlap: float = CHUNK_OVERLAP) -> list:
+    """Split [0, duration] into segments of about `target` seconds, cut inside silences.
+
+    Each segment carries its "core" range (the part it owns in the stitched
+    transcript) and a padded range that overlaps its neighbours by `overlap`.
+
+    Returns: [{'index', 'coreStart', 'coreEnd', 'start', 'end'}, ...]
+    """
+    window = target * CHUNK_SNAP_WINDOW
+    midpoints = [(s + e) / 2 for s, e in silences]
+    cuts = []
+    position = target
+    while position < duration - window:
+        nearby = [m for m in midpoints if abs(m - position) <= window and (not cuts or m > cuts[-1])]
+        cut = min(nearby, key=lambda m: abs(m - position)) if nearby else position
+        cuts.append(cut)
+        position = cut + target
+
+    bounds = [0.0] + cuts + [duration]
+    return [
+        {
+            'index': i,
+            'coreStart': bounds[i],
+            'coreEnd': bounds[i + 1],
+            'start': max(0.0, bounds[i] - overlap),
+            'end': min(duration, bounds[i + 1] + overlap),
+        }
+        for i in range(len(bounds) - 1)
+    ]
+
+
+async def cut_segment(path: str, start: float, end: float) -> str:
+    """Write [start, end] of path to a temp Opus file and return its path (caller removes it)."""
+    fd, segment_path = tempfile.mkstemp(suffix='.ogg', dir=os.path.dirname(path) or None)
+    os.close(fd)
+    cmd = [
+        find_ffmpeg() or FFMPEG_PATH, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+        '-ss', f'{start:.3f}', '-t', f'{end - start:.3f}', '-i', path,
+        '-vn', '-ac', '1', '-ar', str(AUDIO_SAMPLE_RATE),
+        '-c:a', 'libopus', '-b:a', AUDIO_BITRATE, '-application', 'voip',
+        segment_path
+    ]
+    try:
+        returncode, _, stderr = await _run(cmd, FFMPEG_TIMEOUT)
+        if returncode != 0 or os.path.getsize(segment_path) == 0:
+            raise RuntimeError(stderr.strip()[:300] or f"ffmpeg exited with {returncode}")
+    except BaseException:
+        _remove_quietly(segment_path)
+        raise
+    return segment_path
+
+
+def stitch_segments(segments: list) -> str:
+    """Join per-segment word lists into one transcript, dropping overlap duplicates.
+
+    Each segment is {'start', 'coreStart', 'coreEnd', 'words': [{'start', 'end', 'word', 'punctuated_word'}]}
+    with word times relative to the segment. A word is kept only by the
+    segment whose core range contains its midpoint, so words heard twice in
+    an overlap appear once.
+    """
+    ordered = sorted(segments, key=lambda s: s['coreStart'])
+    words = []
+    for segment in ordered:
+        is_last = segment is ordered[-1]
+        for word in segment.get('words') or []:
+            midpoint = segment['start'] + (word.get('start', 0) + word.get('end', 0)) / 2
+            if segment['coreStart'] <= midpoint and (midpoint < segment['coreEnd'] or is_last):
+                words.append(word.get('punctuated_word') or word.get('word', ''))
+    return ' '.join(w for w in words if w)
@@ -0,0 +1,436 @@
+"""Counters, gauges and histograms exposed at /metrics in the Prometheus text format.
+
+Recording a value only touches process memory (a dict lookup and an addition
+under the metric's lock), so instrumentation stays off the I/O path. Each
+worker process writes its values to a small JSON file in METRICS_DIR every
+METRICS_FLUSH_SECONDS; /metrics writes the serving worker's file first and
+then merges every worker's file, the same way the disk caches share one
+directory between gunicorn workers. Counters and histograms are summed over
+all files (including workers that have exited, so totals never go
+backwards); gauges are summed over workers that are still running. Every
+METRICS_COMPACT_SECONDS a worker folds the files of exited workers into one
+archive file and deletes them, and the gunicorn master clears the directory
+when it starts.
+"""
+import os
+import json
+import time
+import bisect
+import inspect
+import tempfile
+import threading
+import logging
+import functools
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server, no cross-process lock needed
+    fcntl = None
+
+import tracing
+from cache import CACHE_ROOT
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(CACHE_ROOT, 'metrics'))
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+METRICS_COMPACT_SECONDS = float(os.getenv('METRICS_COMPACT_SECONDS', 60))
+METRICS_PREFIX = 'vdo_'
+# Counters and histograms of exited workers, folded together by compact()
+ARCHIVE_FILE = 'archived.json'
+
+# Seconds; covers everything from JSON parsing to long transcriptions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = METRICS_PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self) -> list:
+        """[(label values, value)] for this process."""
+        with self._lock:
+            return [(list(key), value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn):
+        """Read the value from fn() at collection time: a number, or {label values tuple: number}."""
+        self._function = fn
+
+    def samples(self) -> list:
+        if self._function is None:
+            return super().samples()
+        try:
+            value = self._function()
+        except Exception as e:
+            logger.warning(f"Metric {self.name} failed: {e}")
+            return []
+        if isinstance(value, dict):
+            return [(list(key), v) for key, v in value.items()]
+        return [([], value)]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, then +Inf, sum and count
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self) -> list:
+        with self._lock:
+            return [(list(key), list(value)) for key, value in self._values.items()]
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+class Registry:
+    """All metrics of this process, plus the per-process files that let workers be merged."""
+
+    def __init__(self, directory: str, flush_seconds: float, compact_seconds: float):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.compact_seconds = compact_seconds
+        self.metrics = {}
+        self._pid = None
+        self._created_pid = os.getpid()
+        self._started_at = time.time()
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def ensure_started(self):
+        """Start this process's flush thread (call from request handling; fork safe)."""
+        # Like the job pool, the flush thread belongs to the process serving requests
+        if not METRICS_ENABLED or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if os.getpid() != self._created_pid:
+                # Forked worker: values inherited from the parent are the parent's to report
+                for metric in self.metrics.values():
+                    with metric._lock:
+                        metric._values.clear()
+            self._pid = os.getpid()
+            self._started_at = time.time()
+            os.makedirs(self.directory, exist_ok=True)
+            threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+
+    def _flush_loop(self):
+        compacted_at = time.monotonic()
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+            if time.monotonic() - compacted_at >= self.compact_seconds:
+                compacted_at = time.monotonic()
+                self.compact()
+
+    def _path(self) -> str:
+        return os.path.join(self.directory, f"{os.getpid()}-{int(self._started_at)}.json")
+
+    def snapshot(self) -> dict:
+        return {name: metric.samples() for name, metric in self.metrics.items()}
+
+    def flush(self):
+        """Write this process's values to its file in METRICS_DIR."""
+        payload = {"pid": os.getpid(), "values": self.snapshot()}
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self._path())
+        except Exception as e:
+            logger.warning(f"Metrics flush failed: {e}")
+
+    def reset(self):
+        """Delete every worker's file and the archive (the gunicorn master calls this on start)."""
+        try:
+            filenames = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for filename in filenames:
+            if filename.endswith(('.json', '.tmp')):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+
+    def compact(self):
+        """Fold the counters and histograms of exited workers into ARCHIVE_FILE and delete their files."""
+        try:
+            with self._locked(exclusive=True):
+                archive = _read(os.path.join(self.directory, ARCHIVE_FILE)) or {}
+                merged = {}
+                self._add(merged, archive.get("values") or {}, gauges=False)
+                # Files folded by a compaction that stopped before deleting them
+                stale = [name for name in archive.get("folded") or []
+                         if os.path.exists(os.path.join(self.directory, name))]
+                folded = []
+                for filename in os.listdir(self.directory):
+                    if not filename.endswith('.json') or filename == ARCHIVE_FILE or filename in stale:
+                        continue
+                    payload = _read(os.path.join(self.directory, filename))
+                    if payload is None or _pid_alive(payload.get("pid")):
+                        continue
+                    self._add(merged, payload.get("values") or {}, gauges=False)
+                    folded.append(filename)
+                if not folded and not stale:
+                    return
+                if folded:
+                    values = {name: [[list(key), value] for key, value in samples.items()]
+                              for name, samples in merged.items()}
+                    fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        json.dump({"pid": None, "values": values, "folded": folded}, f)
+                    os.replace(tmp_path, os.path.join(self.directory, ARCHIVE_FILE))
+                for filename in folded + stale:
+                    try:
+                        os.remove(os.path.join(self.directory, filename))
+                    except FileNotFoundError:
+                        pass
+            logger.info(f"✓ Folded {len(folded)} exited worker metrics file(s) into {ARCHIVE_FILE}")
+        except Exception as e:
+            logger.warning(f"Metrics compaction failed: {e}")
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        # compact() rewrites the archive and deletes files that _merged() is reading
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _add(self, merged: dict, values: dict, gauges: bool):
+        for name, samples in values.items():
+            metric = self.metrics.get(name)
+            if metric is None or (metric.kind == 'gauge' and not gauges):
+                continue
+            target = merged.setdefault(name, {})
+            for labels, value in samples:
+                key = tuple(labels)
+                if metric.kind == 'histogram':
+                    current = target.get(key)
+                    target[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    target[key] = target.get(key, 0) + value
+
+    def _merged(self) -> dict:
+        own = self._path()
+        merged = {name: {} for name in self.metrics}
+        sources = [(os.getpid(), self.snapshot())]
+        with self._locked(exclusive=False):
+            archive = _read(os.path.join(self.directory, ARCHIVE_FILE)) or {}
+            folded = set(archive.get("folded") or [])
+            for filename in os.listdir(self.directory):
+                path = os.path.join(self.directory, filename)
+                if not filename.endswith('.json') or path == own or filename in folded:
+                    continue
+                payload = archive if filename == ARCHIVE_FILE else _read(path)
+                if payload is not None:
+                    sources.append((payload.get("pid"), payload.get("values") or {}))
+
+        for pid, values in sources:
+            self._add(merged, values, gauges=pid == os.getpid() or _pid_alive(pid))
+        return merged
+
+    def render(self) -> str:
+        """All workers' metrics in the Prometheus text exposition format."""
+        self.ensure_started()
+        if METRICS_ENABLED:
+            self.flush()
+        merged = self._merged() if METRICS_ENABLED else {name: {} for name in self.metrics}
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(merged[name].items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.kind != 'histogram':
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs: list) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _read(path: str):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+registry = Registry(METRICS_DIR, METRICS_FLUSH_SECONDS, METRICS_COMPACT_SECONDS)
+
+# Shared metrics recorded by several modules
+stage_seconds = registry.histogram(
+    'stage_duration_seconds', 'Time spent in each pipeline stage', ('stage', 'provider'))
+upstream_bytes = registry.counter(
+    'upstream_bytes_sent_total', 'Request body bytes sent to provider APIs', ('provider',))
+upstream_requests = registry.counter(
+    'upstream_requests_total', 'Provider API attempts by outcome', ('provider', 'outcome'))
+request_outcomes = registry.counter(
+    'http_requests_total', 'Handled HTTP requests by endpoint and outcome', ('endpoint', 'outcome'))
+mock_fallbacks = registry.counter(
+    'mock_fallbacks_total', 'Placeholder transcripts or mock blogs used instead of provider output', ('kind',))
+pipeline_outcomes = registry.counter(
+    'pipeline_outcomes_total', 'Pipeline results by source, failing stage and error class',
+    ('source', 'stage', 'error_class'))
+
+
+def timed(stage: str, provider: str = ''):
+    """Decorator recording each call's duration in stage_seconds and as a span of the job's trace.
+
+    With a provider the span is an outbound call named after it, otherwise a stage.
+    Coroutine functions are timed until they finish, not until the coroutine is created.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    with tracing.span(provider or stage, kind='call' if provider else 'stage'):
+                        return await fn(*args, **kwargs)
+                finally:
+                    stage_seconds.observe(time.perf_counter() - start, stage=stage, provider=provider)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with tracing.span(provider or stage, kind='call' if provider else 'stage'):
+                    return fn(*args, **kwargs)
+            finally:
+                stage_seconds.observe(time.perf_counter() - start, stage=stage, provider=provider)
+        return wrapper
+    return decorator
+
+
+_ERROR_CLASSES = (
+    ('not_configured', ('not set', 'not configured')),
+    ('timeout', ('timed out', 'timeout')),
+    ('blocked', ('429', '403', 'blocked', 'rate limit', 'too many requests')),
+    ('no_content', ('no captions', 'no subtitles', 'no speech', 'disabled', 'empty', 'not available')),
+    ('invalid_output', ('json',)),
+    ('connection', ('connection', 'request failed')),
+    ('upstream_error', ('500', '502', '503', '504', 'error', 'failed')),
+)
+
+
+def error_class(message: str) -> str:
+    """Coarse class of a pipeline error message, for outcome labels."""
+    text = (message or '').lower()
+    for name, needles in _ERROR_CLASSES:
+        if any(needle in text for needle in needles):
+            return name
+    return 'other'
@@ -0,0 +1,193 @@
+"""Single-flight coalescing of identical conversions running at the same time.
+
+A pipeline awaits attach() once it knows its flight key: the normalized
+source (YouTube video ID or the file's SHA-256, see job_store.source_key())
+plus template, model and any option that changes the output. The first job
+for a key leads the flight and runs; a job for the same key that arrives
+while the leader is still running follows it instead and returns the
+leader's result under its own jobId, with a "coalesced" block naming the
+leader. The claim is a transaction on the job store's SQLite database, so
+this works across every worker on the host.
+
+A follower holds no thread while it waits: it gives its job queue worker
+back (job_queue.release_worker()) and awaits a future that one watcher
+task per event loop resolves, checking every leader being waited on with a
+single job store query each COALESCE_POLL_INTERVAL.
+
+If the leader fails, is cancelled, dies or runs past COALESCE_MAX_WAIT, its
+followers claim the flight again: the first of them leads a new flight and
+runs the pipeline, and the rest follow it. "regenerate" requests never
+follow, but do lead, so later requests share the fresh result. A streamed
+upload that declares its hash claims with claim() before transcribing, then
+hands the leader to attach(). Requires the job store (JOB_STORE_ENABLED).
+"""
+import os
+import time
+import threading
+import logging
+
+from job_store import job_store, JOB_STORE_ENABLED, pid_alive
+from jobs import job_queue
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+COALESCE_ENABLED = os.getenv('COALESCE_ENABLED', 'true').lower() == 'true' and JOB_STORE_ENABLED
+# Longest a follower waits for its leader before running the pipeline itself
+COALESCE_MAX_WAIT = float(os.getenv('COALESCE_MAX_WAIT', 900))
+# How often the watcher checks the job store for the results followers wait on
+COALESCE_POLL_INTERVAL = float(os.getenv('COALESCE_POLL_INTERVAL', 0.25))
+
+coalesced_requests = registry.counter(
+    'coalesced_requests_total', 'Jobs that waited for an identical running job instead of running', ('outcome',))
+
+
+def flight_key(source: str, *parts) -> str:
+    """Key of the flight for source plus whatever else shapes the result (template, model, languages)."""
+    if not source:
+        return None
+    return '|'.join([source] + ['' if part is None else ','.join(part) if isinstance(part, (list, tuple))
+                                else str(part) for part in parts])
+
+
+class SingleFlight:
+    """Leads or follows flights in the job store; counts what it shared."""
+
+    def __init__(self, enabled: bool, max_wait: float, poll_interval: float):
+        self.enabled = enabled
+        self.max_wait = max_wait
+        self.poll_interval = max(0.01, poll_interval)
+        self._lock = threading.Lock()
+        self._counters = {"led": 0, "followed": 0, "shared": 0, "fallbacks": 0, "errors": 0}
+        self._waiting = 0
+        # Followers of this process's loop by leader job ID: [(future, leader pid, job_id, started)]
+        self._followers = {}
+        self._watcher = None
+        self._loop = None
+
+    def _count(self, counter: str, n: int = 1):
+        with self._lock:
+            self._counters[counter] += n
+
+    def claim(self, key: str, job_id: str, follow: bool = True) -> tuple:
+        """(job ID, pid) of the running leader to follow, or None if job_id now leads the flight for key."""
+        if not (self.enabled and key):
+            return None
+        try:
+            leader = job_store.claim_flight(key, job_id, follow, self.max_wait)
+        except Exception as e:
+            # Coalescing is an optimization: without the store, every job just runs
+            self._count("errors")
+            logger.warning(f"Single-flight claim failed, running job {job_id} on its own: {e}")
+            return None
+        if leader:
+            self._count("followed")
+            logger.info(f"✓ Job {job_id} coalesced into running job {leader[0]} ({key})")
+        else:
+            self._count("led")
+        return leader
+
+    def _check(self, state: tuple, leader: str, leader_pid: int, job_id: str, started: float) -> tuple:
+        """(done, shared result or None) for a follower, given its leader's row (None if not there yet)."""
+        if state is not None and state[0] in ('completed', 'failed', 'cancelled'):
+            status, result, error = state
+            if status == 'completed' and isinstance(result, dict):
+                return True, self._shared(result, leader, job_id, started)
+            logger.warning(f"Job {leader} that {job_id} waited for ended {status} ({error}); claiming the flight again")
+            return True, None
+        if time.time() - started > self.max_wait or not pid_alive(leader_pid):
+            logger.warning(f"Gave up waiting for job {leader} after {time.time() - started:.0f}s; job {job_id} claims the flight again")
+            return True, None
+        return False, None
+
+    def _shared(self, result: dict, leader: str, job_id: str, started: float) -> dict:
+        waited = round(time.time() - started, 3)
+        self._count("shared")
+        coalesced_requests.inc(outcome='shared')
+        logger.info(f"✓ Job {job_id} got the result of job {leader} after {waited:.1f}s")
+        return {**result, "jobId": job_id, "coalesced": {"jobId": leader, "waitSeconds": waited}}
+
+    def _fallback(self, key: str, job_id: str) -> tuple:
+        self._count("fallbacks")
+        coalesced_requests.inc(outcome='fallback')
+        # The first follower back leads a new flight; the others, and requests arriving now, follow it
+        return self.claim(key, job_id)
+
+    async def attach(self, key: str, job_id: str, follow: bool = True, leader: tuple = None) -> dict:
+        """Lead or follow the flight for key. Returns the shared result, or None to run the pipeline.
+
+        leader is what an earlier claim() for this job returned, to follow it without claiming again.
+        """
+        from aio import event_loop
+
+        if leader is None:
+            leader = await event_loop.offload(self.claim, key, job_id, follow)
+        while leader:
+            job_queue.release_worker()
+            with self._lock:
+                self._waiting += 1
+            try:
+                result = await self._follow(*leader, job_id)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            if result is not None:
+                return result
+            leader = await event_loop.offload(self._fallback, key, job_id)
+        return None
+
+    def _follow(self, leader: str, leader_pid: int, job_id: str):
+        """A future resolved by the watcher with (shared result or None) once the leader is done."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Futures belong to one loop (a new one after fork or re-attach)
+            self._followers, self._watcher, self._loop = {}, None, loop
+        future = loop.create_future()
+        self._followers.setdefault(leader, []).append((future, leader_pid, job_id, time.time()))
+        if self._watcher is None or self._watcher.done():
+            self._watcher = loop.create_task(self._watch())
+        return future
+
+    async def _watch(self):
+        import asyncio
+        from aio import event_loop
+
+        while self._followers:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                states = await event_loop.offload(job_store.job_states, list(self._followers))
+            except Exception as e:
+                logger.warning(f"Single-flight watcher could not read the job store: {e}")
+                continue
+            for leader in list(self._followers):
+                waiting = []
+                for future, leader_pid, job_id, started in self._followers[leader]:
+                    if future.done():
+                        continue  # the follower was cancelled
+                    done, result = self._check(states.get(leader), leader, leader_pid, job_id, started)
+                    if done:
+                        future.set_result(result)
+                    else:
+                        waiting.append((future, leader_pid, job_id, started))
+                if waiting:
+                    self._followers[leader] = waiting
+                else:
+                    del self._followers[leader]
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            waiting = self._waiting
+        return {
+            **counters,
+            "enabled": self.enabled,
+            "waiting": waiting,
+            "maxWaitSeconds": self.max_wait,
+            # All workers, from the flights table
+            "store": job_store.flight_stats() if self.enabled else {},
+        }
+
+
+single_flight = SingleFlight(COALESCE_ENABLED, COALESCE_MAX_WAIT, COALESCE_POLL_INTERVAL)
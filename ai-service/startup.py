@@ -0,0 +1,191 @@
+"""Cold-start accounting and deferred imports for the service.
+
+main.py records a checkpoint after each block of module-level work, so the
+startup report splits the time from process start to a ready app into
+interpreter boot, imports and init. The heavy provider modules (requests,
+youtube-transcript-api, asyncio clients, ffmpeg helpers) are not imported
+at startup: main.py holds lazy_import() proxies that import a module the
+first time one of its attributes is used, and those imports are reported
+too, under "deferred".
+
+STARTUP_WARMUP decides when the deferred modules are loaded:
+
+    background  (default) in a thread started by a worker's first request,
+                so /health answers at once and real requests rarely wait
+    eager       inside create_app(); use with gunicorn preload_app (see
+                gunicorn.conf.py) so workers fork with everything loaded
+    lazy        each module on first use
+"""
+import os
+import time
+import threading
+import importlib
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', 'background').lower()
+
+
+def _process_start_time() -> float:
+    """Wall-clock time this process started (Linux), or None."""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22, after the parenthesised command name (which may contain spaces)
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupReport:
+    """Where the time between process start and a ready app went."""
+
+    def __init__(self):
+        self.process_started = _process_start_time()
+        self.first_checkpoint = time.time()
+        self._last = time.perf_counter()
+        self._checkpoints = []
+        self._deferred = []
+        self._ready_at = None
+        self._warmup = None
+        self._lock = threading.Lock()
+
+    def checkpoint(self, name: str, kind: str = 'import'):
+        """Record the time since the previous checkpoint as `name` (kind 'import' or 'init')."""
+        now = time.perf_counter()
+        with self._lock:
+            self._checkpoints.append((name, kind, now - self._last))
+            self._last = now
+
+    @contextmanager
+    def phase(self, name: str, kind: str = 'init'):
+        """Record the block's duration as `name`, restarting the checkpoint clock after it."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            with self._lock:
+                self._checkpoints.append((name, kind, now - start))
+                self._last = now
+
+    def deferred(self, name: str, seconds: float):
+        with self._lock:
+            self._deferred.append((name, seconds))
+
+    def ready(self):
+        """Mark the app ready to serve; returns the report."""
+        with self._lock:
+            if self._ready_at is None:
+                self._ready_at = time.time()
+        report = self.stats()
+        logger.info(f"✓ Startup: ready in {report['readySeconds']:.3f}s "
+                    f"(interpreter {report['interpreterSeconds'] or 0:.3f}s, imports {report['importSeconds']:.3f}s, "
+                    f"init {report['initSeconds']:.3f}s; warm-up: {STARTUP_WARMUP})")
+        return report
+
+    def warmup_finished(self, seconds: float):
+        with self._lock:
+            self._warmup = seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            checkpoints = list(self._checkpoints)
+            deferred = list(self._deferred)
+            ready_at = self._ready_at
+            warmup = self._warmup
+        interpreter = None
+        if self.process_started is not None:
+            interpreter = max(0.0, self.first_checkpoint - self.process_started)
+        started = self.process_started if self.process_started is not None else self.first_checkpoint
+        return {
+            "pid": os.getpid(),
+            "warmup": STARTUP_WARMUP,
+            "readySeconds": round(ready_at - started, 3) if ready_at else None,
+            "interpreterSeconds": round(interpreter, 3) if interpreter is not None else None,
+            "importSeconds": round(sum(s for _, kind, s in checkpoints if kind == 'import'), 3),
+            "initSeconds": round(sum(s for _, kind, s in checkpoints if kind == 'init'), 3),
+            "phases": [{"name": name, "kind": kind, "seconds": round(s, 4)} for name, kind, s in checkpoints],
+            "deferred": {name: round(s, 4) for name, s in deferred},
+            "warmupSeconds": round(warmup, 3) if warmup is not None else None,
+        }
+
+
+startup_report = StartupReport()
+
+
+class LazyModule:
+    """Stands in for a module until one of its attributes is used, then imports it (once, thread safe).
+
+    Attribute reads are forwarded on every access, so a module global that is
+    reassigned later (e.g. youtube.STRATEGIES in the load test) is seen.
+    """
+
+    def __init__(self, name: str):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                start = time.perf_counter()
+                module = importlib.import_module(self._name)
+                startup_report.deferred(self._name, time.perf_counter() - start)
+                self.__dict__['_module'] = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._module or self._load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+_lazy_modules = {}
+
+
+def lazy_import(name: str) -> LazyModule:
+    module = _lazy_modules.get(name)
+    if module is None:
+        module = _lazy_modules[name] = LazyModule(name)
+    return module
+
+
+def loaded(module) -> bool:
+    """Whether a lazy_import() proxy has imported its module yet (always True for a real module)."""
+    return not isinstance(module, LazyModule) or module._module is not None
+
+
+def warm_up():
+    """Import every deferred module now, timed as the report's warm-up."""
+    start = time.perf_counter()
+    for module in list(_lazy_modules.values()):
+        try:
+            module._load()
+        except Exception as e:
+            logger.warning(f"Warm-up import of {module._name} failed: {e}")
+    startup_report.warmup_finished(time.perf_counter() - start)
+
+
+_background = {"pid": None}
+_background_lock = threading.Lock()
+
+
+def warm_up_in_background():
+    """Start warm_up() on a daemon thread, once per process (so never in a preloading gunicorn master)."""
+    if _background["pid"] == os.getpid():
+        return
+    with _background_lock:
+        if _background["pid"] == os.getpid():
+            return
+        _background["pid"] = os.getpid()
+    threading.Thread(target=warm_up, name="startup-warmup", daemon=True).start()
@@ -0,0 +1,284 @@
+"""Per-job traces: spans for each stage and outbound call, written to a rotating JSONL file.
+
+A trace is keyed by the job ID (the backend's jobId when it sends one). The
+request handler and the pipeline open it with tracer.job(); nested job()
+calls for the same ID share one trace. Code running under it can add spans
+(span()) or point events such as retries, proxy choice and cache hits
+(event()). Calls made with no trace active are no-ops, so library
+code can be instrumented unconditionally. Threads started for a job inherit
+its trace through propagate(). When the job finishes, the trace is appended
+as one line to TRACE_FILE, which rotates at TRACE_MAX_MB, and summary()
+gives the compact `timings` block added to results.
+"""
+import os
+import json
+import time
+import threading
+import functools
+import inspect
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from cache import CACHE_ROOT
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server, no cross-process lock needed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+TRACE_FILE = os.getenv('TRACE_FILE', os.path.join(CACHE_ROOT, 'traces', 'traces.jsonl'))
+TRACE_MAX_BYTES = int(float(os.getenv('TRACE_MAX_MB', 50)) * 1024 * 1024)
+TRACE_BACKUPS = int(os.getenv('TRACE_BACKUPS', 5))
+# Chunked transcriptions can produce many calls; later spans are counted, not kept
+TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', 500))
+
+_current_trace = contextvars.ContextVar('trace', default=None)
+_current_span = contextvars.ContextVar('span', default=None)
+
+
+class Trace:
+    """Spans and events of one job, timed relative to the trace start."""
+
+    def __init__(self, trace_id: str, kind: str):
+        self.trace_id = trace_id
+        self.kind = kind
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans = []
+        self.dropped = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def offset(self) -> float:
+        return time.perf_counter() - self._start
+
+    def add(self, span: dict) -> dict:
+        with self._lock:
+            self._next_id += 1
+            span["id"] = self._next_id
+            if len(self.spans) < TRACE_MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+        return span
+
+    def summary(self) -> dict:
+        """Compact timings: total, seconds per stage, per outbound call target, and cache hits."""
+        with self._lock:
+            spans = list(self.spans)
+        stages = {}
+        calls = {}
+        cache_hits = []
+        retries = 0
+        for span in spans:
+            kind = span.get("kind")
+            seconds = span.get("seconds") or 0
+            if kind == 'stage':
+                stages[span["name"]] = round(stages.get(span["name"], 0) + seconds, 3)
+            elif kind == 'call':
+                entry = calls.setdefault(span["name"], {"count": 0, "seconds": 0})
+                entry["count"] += 1
+                entry["seconds"] = round(entry["seconds"] + seconds, 3)
+            elif kind == 'event':
+                if span["name"] == 'cache_hit':
+                    cache_hits.append(span.get("attrs", {}).get("cache"))
+                elif span["name"] == 'retry':
+                    retries += 1
+        timings = {
+            "traceId": self.trace_id,
+            "totalSeconds": round(self.offset(), 3),
+            "stages": stages,
+            "calls": calls,
+        }
+        if cache_hits:
+            timings["cacheHits"] = cache_hits
+        if retries:
+            timings["retries"] = retries
+        return timings
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "traceId": self.trace_id,
+            "kind": self.kind,
+            "startedAt": self.started_at,
+            "seconds": round(self.offset(), 4),
+            "spans": spans,
+            "droppedSpans": self.dropped,
+        }
+
+
+class Tracer:
+    """Open traces by ID and the rotating file finished ones are written to."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._open = {}
+        self._depth = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def job(self, trace_id: str, kind: str):
+        """Run the block under trace_id; the trace is written when the outermost job() exits."""
+        if not TRACING_ENABLED or not trace_id:
+            yield None
+            return
+        with self._lock:
+            trace = self._open.get(trace_id)
+            if trace is None:
+                trace = self._open[trace_id] = Trace(trace_id, kind)
+            self._depth[trace_id] = self._depth.get(trace_id, 0) + 1
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(None)
+        try:
+            yield trace
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            with self._lock:
+                self._depth[trace_id] = self._depth.get(trace_id, 1) - 1
+                finished = self._depth[trace_id] <= 0
+                if finished:
+                    self._open.pop(trace_id, None)
+                    self._depth.pop(trace_id, None)
+            if finished:
+                self.write(trace)
+
+    def write(self, trace: Trace):
+        line = json.dumps(trace.to_dict(), separators=(',', ':')) + '\n'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + '.lock', 'a') as lock:
+                # Workers share the file; rotation and appends take the same lock
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                        self._rotate()
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(line)
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock, fcntl.LOCK_UN)
+        except OSError as e:
+            logger.warning(f"Could not write trace {trace.trace_id}: {e}")
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def find(self, trace_id: str) -> list:
+        """All written traces with trace_id, newest file first."""
+        needle = f'"traceId":{json.dumps(trace_id)}'
+        found = []
+        for path in [self.path] + [f"{self.path}.{i}" for i in range(1, self.backups + 1)]:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if needle in line:
+                            try:
+                                found.append(json.loads(line))
+                            except ValueError:
+                                continue
+            except FileNotFoundError:
+                continue
+        found.sort(key=lambda t: t.get("startedAt", 0), reverse=True)
+        return found
+
+
+tracer = Tracer(TRACE_FILE, TRACE_MAX_BYTES, TRACE_BACKUPS)
+
+
+def current() -> Trace:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, kind: str = 'stage', **attrs):
+    """Time the block as a span of the current trace (no-op without one).
+
+    Yields the span's attrs dict so the block can add results (status, bytes, ...).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield {}
+        return
+    record = {"name": name, "kind": kind, "parent": _current_span.get(), "start": round(trace.offset(), 4),
+              "attrs": dict(attrs)}
+    trace.add(record)
+    token = _current_span.set(record["id"])
+    start = time.perf_counter()
+    try:
+        yield record["attrs"]
+    except BaseException as e:
+        record["attrs"]["error"] = f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 4)
+        _current_span.reset(token)
+        if not record["attrs"]:
+            del record["attrs"]
+
+
+def event(name: str, **attrs):
+    """Record a point event (retry, proxy choice, cache hit, ...) in the current trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    trace.add({"name": name, "kind": "event", "parent": _current_span.get(),
+               "start": round(trace.offset(), 4), "attrs": attrs})
+
+
+def summary() -> dict:
+    """The current trace's compact timings, or None outside a trace."""
+    trace = _current_trace.get()
+    return trace.summary() if trace else None
+
+
+def traced_job(kind: str):
+    """Decorator running fn(job_id, ...) under the trace for job_id (coroutine functions too)."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(job_id, *args, **kwargs):
+                with tracer.job(job_id, kind):
+                    return await fn(job_id, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(job_id, *args, **kwargs):
+            with tracer.job(job_id, kind):
+                return fn(job_id, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def propagate(fn):
+    """Wrap fn so it runs under the caller's trace and span when called on another thread."""
+    trace = _current_trace.get()
+    if trace is None:
+        return fn
+    parent = _current_span.get()
+
+    def run(*args, **kwargs):
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+    return run
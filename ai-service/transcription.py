@@ -0,0 +1,281 @@
+"""Routing transcription jobs across providers.
+
+Each registered provider has a circuit breaker and a window of recent
+latencies. A job goes to the preferred provider whose breaker is closed; if
+it runs past its hedge budget (or fails), the next healthy provider is
+started too and whichever succeeds first wins; the other is cancelled. The
+budget is the provider's p95 seconds per second of media, times the file's
+duration, so a long file isn't hedged just for being long. Providers are coroutines run on the pipeline's loop.
+Transcripts are cached per provider/model by content hash, so a file that
+any provider already transcribed is not sent again.
+"""
+import os
+import time
+import asyncio
+import threading
+import logging
+from collections import deque
+
+import media
+import tracing
+from cache import transcript_cache, transcript_cache_key
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIBE_HEDGING = os.getenv('TRANSCRIBE_HEDGING', 'true').lower() == 'true'
+# The hedge budget until a provider has TRANSCRIBE_HEDGE_MIN_SAMPLES timed files, or for media of unknown duration
+TRANSCRIBE_HEDGE_AFTER = float(os.getenv('TRANSCRIBE_HEDGE_AFTER', 45))
+TRANSCRIBE_HEDGE_MIN_SAMPLES = int(os.getenv('TRANSCRIBE_HEDGE_MIN_SAMPLES', 20))
+# Shortest hedge budget, however short the file
+TRANSCRIBE_HEDGE_MIN = float(os.getenv('TRANSCRIBE_HEDGE_MIN', 5))
+TRANSCRIBE_BREAKER_FAILURES = int(os.getenv('TRANSCRIBE_BREAKER_FAILURES', 3))
+TRANSCRIBE_BREAKER_RESET = float(os.getenv('TRANSCRIBE_BREAKER_RESET', 60))
+
+
+class CircuitBreaker:
+    """Closed -> open after `failures` consecutive errors; half-open after `reset_timeout` lets one probe through."""
+
+    def __init__(self, failures: int = TRANSCRIBE_BREAKER_FAILURES, reset_timeout: float = TRANSCRIBE_BREAKER_RESET):
+        self.failure_threshold = max(1, failures)
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release(self):
+        """Give back a half-open probe slot that allow() granted but wasn't used."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, success: bool):
+        with self._lock:
+            self._probing = False
+            if success:
+                self.state = 'closed'
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.trips += 1
+                self.state = 'open'
+                self.opened_at = time.time()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutiveFailures": self.consecutive_failures,
+                "trips": self.trips,
+                "retryIn": round(max(0.0, self.opened_at + self.reset_timeout - time.time()), 1)
+                if self.state == 'open' else None,
+            }
+
+
+class Provider:
+    """A transcription backend: coroutine fn(video_path) -> result dict (with the media 'duration' if known)."""
+
+    def __init__(self, name: str, fn, model: str, configured, window: int = 200):
+        self.name = name
+        self.fn = fn
+        self.model = model
+        self.configured = configured
+        self.breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=window)
+        self.rates = deque(maxlen=window)  # seconds per second of media, for files of known duration
+        self.counters = {"requests": 0, "wins": 0, "failures": 0, "hedges": 0, "cancelled": 0}
+
+
+class ProviderRouter:
+    """Sends each job to the preferred healthy provider, hedging to the next one when it is slow."""
+
+    def __init__(self, hedging: bool = TRANSCRIBE_HEDGING, hedge_after: float = TRANSCRIBE_HEDGE_AFTER):
+        self.hedging = hedging
+        self.hedge_after = hedge_after
+        self.providers = []
+        self._lock = threading.Lock()
+
+    def register(self, name: str, fn, model: str, configured=lambda: True):
+        """Add a provider; earlier registrations are preferred."""
+        self.providers.append(Provider(name, fn, model, configured))
+
+    def _count(self, provider: Provider, counter: str):
+        with self._lock:
+            provider.counters[counter] += 1
+
+    async def transcribe(self, video_path: str, content_hash: str = None) -> dict:
+        """Transcribe video_path with the first provider to succeed.
+
+        Returns: the winning provider's result plus 'provider' and 'hedged' (a
+        second provider was started because the first was slow), or 'cached':
+        True on a transcript cache hit
+        """
+        from aio import event_loop
+
+        configured = [p for p in self.providers if p.configured()]
+        if not configured:
+            # Let the last provider produce its "not configured" (mock) result
+            return await self.providers[-1].fn(video_path)
+
+        if content_hash:
+            cached = await event_loop.offload(self._cached, configured, content_hash)
+            if cached:
+                return cached
+
+        candidates = [p for p in configured if p.breaker.allow()]
+        if not candidates:
+            logger.warning("All transcription circuit breakers are open - trying the preferred provider anyway")
+            candidates = configured[:1]
+
+        # Only a provider with enough timed files has a budget that depends on the duration
+        duration = None
+        if self.hedging and len(candidates) > 1 and len(candidates[0].rates) >= TRANSCRIBE_HEDGE_MIN_SAMPLES:
+            duration = await media.probe_duration(video_path)
+
+        result = await self._run(video_path, candidates, duration)
+        if content_hash and result.get('success'):
+            provider = next(p for p in self.providers if p.name == result['provider'])
+            await event_loop.offload(transcript_cache.set,
+                                     transcript_cache_key(content_hash, provider.name, provider.model),
+                                     {'text': result['text']})
+        return result
+
+    def _cached(self, configured: list, content_hash: str) -> dict:
+        for provider in configured:
+            cached = transcript_cache.get(transcript_cache_key(content_hash, provider.name, provider.model))
+            if cached:
+                logger.info(f"✓ Transcript cache hit ({provider.name}, sha256 {content_hash[:12]})")
+                tracing.event('cache_hit', cache='transcript', provider=provider.name)
+                return {'success': True, 'text': cached['text'], 'error': None,
+                        'cached': True, 'provider': provider.name}
+        return None
+
+    async def _run(self, video_path: str, candidates: list, duration: float = None) -> dict:
+        running = {}
+        hedged = []
+
+        async def run(provider):
+            try:
+                return await provider.fn(video_path)
+            except Exception as e:
+                return {'success': False, 'text': None, 'error': f"{provider.name} transcription exception: {e}"}
+
+        def launch(provider, hedge=False):
+            self._count(provider, "requests")
+            if hedge:
+                hedged.append(provider)
+                self._count(provider, "hedges")
+                logger.info(f"Hedging transcription to {provider.name}")
+                tracing.event('hedge', provider=provider.name)
+            running[asyncio.ensure_future(run(provider))] = (provider, time.time())
+
+        launch(candidates[0])
+        pending = list(candidates[1:])
+        try:
+            result = await self._wait(running, pending, launch, duration)
+            return {**result, 'hedged': bool(hedged)}
+        finally:
+            # Hedged requests still running when another provider won (or the job was cancelled);
+            # a cancelled half-open probe gives its slot back, or the breaker would never let one through again
+            for task, (provider, _) in running.items():
+                task.cancel()
+                provider.breaker.release()
+                self._count(provider, "cancelled")
+            # Half-open breakers that granted a probe we never sent
+            for provider in pending:
+                provider.breaker.release()
+
+    async def _wait(self, running: dict, pending: list, launch, duration: float = None) -> dict:
+        first, _ = next(iter(running.values()))
+        hedge_at = time.time() + self.hedge_budget(first, duration)
+        last_result = {}
+        while True:
+            if not running:
+                # Everything running has failed: fall back to the next provider now
+                if not pending:
+                    break
+                provider = pending.pop(0)
+                launch(provider)
+                hedge_at = time.time() + self.hedge_budget(provider, duration)
+                continue
+            timeout = max(0.0, hedge_at - time.time()) if pending and self.hedging else None
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                provider = pending.pop(0)
+                launch(provider, hedge=True)
+                hedge_at = time.time() + self.hedge_budget(provider, duration)
+                continue
+
+            for task in done:
+                provider, start = running.pop(task)
+                result, seconds = task.result(), time.time() - start
+                last_result = {**result, 'provider': provider.name}
+                self._record(provider, result, seconds, duration)
+                if result.get('success'):
+                    self._count(provider, "wins")
+                    logger.info(f"✓ Transcribed by {provider.name} in {seconds:.1f}s")
+                    return last_result
+                logger.warning(f"{provider.name} transcription failed: {result.get('error')}")
+        return last_result
+
+    def hedge_budget(self, provider: Provider, duration: float = None) -> float:
+        """Seconds to give provider before hedging: its p95 seconds per media second times duration."""
+        with self._lock:
+            rates = sorted(provider.rates)
+        if not duration or len(rates) < TRANSCRIBE_HEDGE_MIN_SAMPLES:
+            return self.hedge_after
+        return max(TRANSCRIBE_HEDGE_MIN, rates[min(len(rates) - 1, int(0.95 * len(rates)))] * duration)
+
+    def _record(self, provider: Provider, result: dict, seconds: float, duration: float = None):
+        # Providers report the media duration they transcribed, so rates are learned without probing
+        duration = result.get('duration') or duration
+        # "No speech" is about the file, not the provider's health (but it ends a half-open probe)
+        if result.get('success') or not result.get('no_speech'):
+            provider.breaker.record(bool(result.get('success')))
+        else:
+            provider.breaker.release()
+        if result.get('success'):
+            with self._lock:
+                provider.latencies.append(seconds)
+                if duration:
+                    provider.rates.append(seconds / duration)
+        else:
+            self._count(provider, "failures")
+
+    def stats(self) -> dict:
+        providers = {}
+        with self._lock:
+            for provider in self.providers:
+                latencies = sorted(provider.latencies)
+                rates = sorted(provider.rates)
+                providers[provider.name] = {
+                    **provider.counters,
+                    "configured": bool(provider.configured()),
+                    "model": provider.model,
+                    "breaker": provider.breaker.snapshot(),
+                    "p50": _percentile(latencies, 0.5),
+                    "p95": _percentile(latencies, 0.95),
+                    "p95SecondsPerMediaSecond": _percentile(rates, 0.95),
+                }
+        return {"hedging": self.hedging, "hedgeAfter": self.hedge_after, "providers": providers}
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(q * len(values)))], 3)
@@ -0,0 +1,422 @@
+"""Fetching YouTube captions.
+
+Two strategies can produce a transcript: the youtube-transcript-api client,
+which lists the caption tracks once and fetches the best-ranked one, and
+yt-dlp running in a pool of warm helper processes (ytdlp_worker.py). On a
+blocked cloud IP either one can stall for a long time, so by default they
+are raced: the API path starts immediately, yt-dlp follows after
+YOUTUBE_RACE_STAGGER seconds (or as soon as the API path fails), the first
+non-empty transcript wins and the loser is cancelled. The race runs as a
+coroutine, with the strategies on the event loop's bounded blocking pool.
+Per-strategy win rates and latencies are kept to help tune the stagger.
+"""
+import os
+import re
+import time
+import asyncio
+import threading
+import logging
+from collections import deque
+
+from ytdlp_worker import ytdlp_pool
+from proxy_pool import proxy_pool
+from aio import event_loop
+import tracing
+from metrics import stage_seconds
+from youtube_transcript_api import TranscriptsDisabled, NoTranscriptFound, VideoUnavailable, RequestBlocked
+
+logger = logging.getLogger(__name__)
+
+YOUTUBE_RACE = os.getenv('YOUTUBE_RACE', 'true').lower() == 'true'
+YOUTUBE_RACE_STAGGER = float(os.getenv('YOUTUBE_RACE_STAGGER', 2.0))
+# Proxies the API strategy tries for the track listing before giving up
+YOUTUBE_PROXY_ATTEMPTS = int(os.getenv('YOUTUBE_PROXY_ATTEMPTS', 2))
+
+# Default caption language preference, most wanted first
+YOUTUBE_LANGUAGES = [code.strip() for code in os.getenv(
+    'YOUTUBE_LANGUAGES', 'en,en-US,en-GB,hi,hi-IN,es,fr,de,pt,ru,ja,ko').split(',') if code.strip()]
+
+
+class StrategyStats:
+    """Win/failure counts and recent latencies per caption strategy."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, strategy: str, outcome: str, seconds: float = None):
+        """outcome is one of 'win', 'loss' (succeeded too late), 'failure' or 'cancelled'."""
+        with self._lock:
+            entry = self._stats.setdefault(strategy, {
+                "runs": 0, "win": 0, "loss": 0, "failure": 0, "cancelled": 0,
+                "latencies": deque(maxlen=self.window),
+            })
+            entry["runs"] += 1
+            entry[outcome] += 1
+            if seconds is not None and outcome in ('win', 'failure'):
+                entry["latencies"].append(seconds)
+        if seconds is not None and outcome != 'cancelled':
+            stage_seconds.observe(seconds, stage='youtube', provider=strategy)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            for strategy, entry in self._stats.items():
+                latencies = sorted(entry["latencies"])
+                result[strategy] = {
+                    "runs": entry["runs"],
+                    "wins": entry["win"],
+                    "losses": entry["loss"],
+                    "failures": entry["failure"],
+                    "cancelled": entry["cancelled"],
+                    "winRate": round(entry["win"] / entry["runs"], 3) if entry["runs"] else None,
+                    "p50": _percentile(latencies, 0.5),
+                    "p95": _percentile(latencies, 0.95),
+                }
+            return result
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(q * len(values)))], 3)
+
+
+strategy_stats = StrategyStats()
+
+
+_BLOCKED_RE = re.compile(r'\b(403|429)\b')
+
+
+def _describe(error: Exception) -> str:
+    """Exception type and first line of its message (the library's messages run to pages)."""
+    lines = [line for line in str(error).splitlines() if line.strip()]
+    return f"{type(error).__name__}: {lines[0][:200]}" if lines else type(error).__name__
+
+
+def _is_blocked(error: Exception) -> bool:
+    """Whether an error means YouTube rejected the proxy (429/403) rather than a network failure."""
+    text = str(error)
+    return isinstance(error, RequestBlocked) or bool(_BLOCKED_RE.search(text)) or 'not a bot' in text
+
+
+def _snippet_text(fetched_transcript) -> str:
+    """Join the text of a FetchedTranscript (snippet objects) or a list of dicts."""
+    full_text = ""
+    for snippet in fetched_transcript:
+        text = getattr(snippet, 'text', None)
+        if text is None and isinstance(snippet, dict):
+            text = snippet.get('text')
+        if text:
+            full_text += text + " "
+    return full_text
+
+
+def rank_tracks(transcript_list, languages: list) -> list:
+    """Order the listed caption tracks for fetching.
+
+    Tracks in a preferred language come first (in preference order), manual
+    before auto-generated within a language, then tracks in other languages,
+    and last translations of translatable tracks into the first preferred
+    language that has no track of its own.
+
+    Returns: [(Transcript, translate_to or None), ...]
+    """
+    tracks = list(transcript_list)
+    rank = {code: i for i, code in enumerate(languages)}
+    ordered = sorted(tracks, key=lambda t: (rank.get(t.language_code, len(languages)), t.is_generated))
+
+    available = {t.language_code for t in tracks}
+    target = next((code for code in languages if code not in available), None)
+    translations = []
+    if target:
+        for track in sorted(tracks, key=lambda t: t.is_generated):
+            codes = {getattr(lang, 'language_code', None) for lang in getattr(track, 'translation_languages', [])}
+            if track.is_translatable and target in codes:
+                translations.append((track, target))
+    return [(track, None) for track in ordered] + translations
+
+
+def track_info(track, translate_to: str = None) -> dict:
+    """Metadata for the caption track a transcript came from."""
+    return {
+        "language": track.language,
+        "languageCode": translate_to or track.language_code,
+        "isGenerated": track.is_generated,
+        "translatedFrom": track.language_code if translate_to else None,
+    }
+
+
+def fetch_with_api(video_id: str, cancel: threading.Event, languages: list) -> dict:
+    """Strategy 1: youtube-transcript-api; list the tracks once and fetch the best-ranked one.
+
+    The listing goes through a proxy from the pool and is retried on another
+    proxy (up to YOUTUBE_PROXY_ATTEMPTS) when it fails. The next track in
+    rank_tracks() order is only fetched if the previous one fails. Checks
+    `cancel` between requests; a request already in flight is left to finish
+    and its result discarded.
+
+    Returns: {'success', 'text', 'error', 'language', 'track', 'no_captions'}
+    """
+    failure = {'success': False, 'text': None, 'error': 'youtube-transcript-api found no usable transcript'}
+    tried = []
+    for _ in range(max(1, YOUTUBE_PROXY_ATTEMPTS)):
+        proxy = proxy_pool.choose(exclude=tuple(tried))
+        if cancel.is_set() or proxy in tried:
+            break
+        tried.append(proxy)
+        tracing.event('proxy', strategy='api', proxy=proxy_pool.label(proxy))
+        with proxy_pool.api_client(proxy) as ytt_api:
+            start = time.time()
+            try:
+                transcript_list = ytt_api.list(video_id)
+            except (TranscriptsDisabled, NoTranscriptFound, VideoUnavailable) as e:
+                proxy_pool.report(proxy, True, time.time() - start)
+                logger.warning(f"No captions available for {video_id}: {type(e).__name__}")
+                return {**failure, 'no_captions': True}
+            except Exception as e:
+                proxy_pool.report(proxy, False, blocked=_is_blocked(e), error=_describe(e))
+                logger.warning(f"Strategy 1 (API) failed via {proxy_pool.label(proxy)}: {_describe(e)}")
+                failure = {**failure, 'error': f"youtube-transcript-api failed: {_describe(e)}"}
+                continue
+            proxy_pool.report(proxy, True, time.time() - start)
+            return _fetch_ranked(transcript_list, languages, cancel, proxy, failure)
+    return failure
+
+
+def _fetch_ranked(transcript_list, languages: list, cancel: threading.Event, proxy, failure: dict) -> dict:
+    candidates = rank_tracks(transcript_list, languages)
+    if not candidates:
+        # Listing worked but the video has no caption tracks at all
+        return {**failure, 'no_captions': True}
+
+    for track, translate_to in candidates:
+        if cancel.is_set():
+            return failure
+        try:
+            source = track.translate(translate_to) if translate_to else track
+            full_text = _snippet_text(source.fetch())
+        except Exception as e:
+            if _is_blocked(e):
+                proxy_pool.report(proxy, False, blocked=True, error=_describe(e))
+                return {**failure, 'error': f"youtube-transcript-api blocked: {_describe(e)}"}
+            logger.warning(f"Caption track {track.language_code} failed, trying the next one: {e}")
+            continue
+        if full_text.strip():
+            info = track_info(track, translate_to)
+            logger.info(f"✓ YouTube transcript fetched (API, {info['languageCode']}"
+                        f"{', auto' if track.is_generated else ''}): {len(full_text)} chars")
+            return {'success': True, 'text': full_text, 'error': None,
+                    'language': info['languageCode'], 'track': info}
+    return failure
+
+
+def parse_vtt(vtt: str) -> str:
+    """Plain text of a WebVTT document, without cue timings, tags or repeated lines."""
+    lines = []
+    for line in vtt.splitlines():
+        line = line.strip()
+        if '-->' in line or not line or line.startswith('WEBVTT') or line.startswith('NOTE'):
+            continue
+        line = re.sub(r'<[^>]+>', '', line)
+        if not lines or lines[-1] != line:
+            lines.append(line)
+    return ' '.join(lines)
+
+
+def fetch_with_ytdlp(video_id: str, cancel: threading.Event, languages: list) -> dict:
+    """Strategy 2: download subtitles in a warm yt-dlp helper; the helper is killed if `cancel` is set.
+
+    Returns: {'success', 'text', 'error', 'language', 'track'}
+    """
+    logger.info("Attempting Strategy 2: yt-dlp...")
+    proxy = proxy_pool.choose()
+    tracing.event('proxy', strategy='yt-dlp', proxy=proxy_pool.label(proxy))
+    start = time.time()
+    result = ytdlp_pool.download_subtitles(video_id, languages, proxy=proxy.url, cancel=cancel)
+    error = result.get('error') or ''
+    if result.get('success') or 'no subtitles' in error:
+        proxy_pool.report(proxy, True, time.time() - start)
+    elif not cancel.is_set():
+        proxy_pool.report(proxy, False, blocked=_is_blocked(error), error=error)
+    if not result.get('success'):
+        logger.warning(f"yt-dlp failed: {result.get('error')}")
+        return {'success': False, 'text': None, 'error': result.get('error')}
+
+    full_text = parse_vtt(result['vtt'])
+    if len(full_text) > 50:
+        track = result.get('track') or {}
+        logger.info(f"✓ YouTube transcript fetched (yt-dlp): {len(full_text)} chars")
+        return {'success': True, 'text': full_text, 'error': None,
+                'language': track.get('languageCode'), 'track': track}
+    return {'success': False, 'text': None, 'error': 'yt-dlp subtitles were empty'}
+
+
+STRATEGIES = [('api', fetch_with_api), ('yt-dlp', fetch_with_ytdlp)]
+
+
+# Playlist, channel and handle URLs whose videos can be listed for batch ingestion
+_COLLECTION_RE = re.compile(r'youtube\.com/(?:playlist\?|channel/|c/|user/|@)|[?&]list=')
+
+
+def is_collection_url(url: str) -> bool:
+    return bool(_COLLECTION_RE.search(url or ''))
+
+
+def expand_playlist(url: str, cancel: threading.Event = None) -> dict:
+    """List the videos of a playlist or channel URL through the yt-dlp helpers.
+
+    Returns: {'success': bool, 'entries': [{'id', 'title'}, ...], 'title': str, 'error': str or None}
+    """
+    proxy = proxy_pool.choose()
+    tracing.event('proxy', strategy='playlist', proxy=proxy_pool.label(proxy))
+    start = time.time()
+    result = ytdlp_pool.expand_playlist(url, proxy=proxy.url, cancel=cancel)
+    if result.get('success'):
+        proxy_pool.report(proxy, True, time.time() - start)
+        logger.info(f"✓ Expanded {url}: {len(result['entries'])} videos")
+    elif not (cancel and cancel.is_set()):
+        error = result.get('error') or ''
+        proxy_pool.report(proxy, False, blocked=_is_blocked(error), error=error)
+        logger.warning(f"Could not expand {url}: {error}")
+    return result
+
+
+async def fetch_youtube_transcript(video_id: str, languages: list = None) -> dict:
+    """Get a transcript from YouTube, racing or chaining the caption strategies.
+
+    languages is the caption language preference (defaults to YOUTUBE_LANGUAGES). The strategies run on
+    the event loop's blocking pool; cancelling the task cancels them.
+
+    Returns: {'success': bool, 'text': str, 'error': str or None, 'language': str,
+              'track': caption track metadata (API strategy), 'strategy': str,
+              'no_captions': bool (YouTube reported that no captions exist)}
+    """
+    languages = languages or YOUTUBE_LANGUAGES
+    logger.info(f"Fetching YouTube transcript for video: {video_id} (languages: {','.join(languages)})")
+    if YOUTUBE_RACE:
+        results = await _race(video_id, languages, STRATEGIES, YOUTUBE_RACE_STAGGER)
+    else:
+        results = await _chain(video_id, languages, STRATEGIES)
+    return _best_result(results)
+
+
+def _best_result(results: list) -> dict:
+    """The transcript result for a video from its strategies' [(name, result), ...]."""
+    for name, result in results:
+        if result.get('success'):
+            return {**result, 'strategy': name}
+
+    if any(result.get('no_captions') for _, result in results):
+        return {'success': False, 'text': None, 'error': 'No captions available for this video.', 'no_captions': True}
+    return {
+        'success': False,
+        'text': None,
+        'error': 'Failed to fetch transcript. YouTube may be blocking requests or no captions available.'
+    }
+
+
+async def _chain(video_id: str, languages: list, strategies: list) -> list:
+    """Run strategies one after another until one succeeds or finds there are no captions."""
+    results = []
+    cancel = threading.Event()
+    try:
+        for name, fn in strategies:
+            start = time.time()
+            result = await event_loop.offload(_run_strategy, name, fn, video_id, cancel, languages)
+            results.append((name, result))
+            strategy_stats.record(name, 'win' if result.get('success') else 'failure', time.time() - start)
+            if result.get('success') or result.get('no_captions'):
+                break
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
+    return results
+
+
+def _run_strategy(name: str, fn, video_id: str, cancel: threading.Event, languages: list) -> dict:
+    """Run one strategy as a call span of the job's trace."""
+    with tracing.span(f"youtube.{name}", kind='call') as attrs:
+        result = fn(video_id, cancel, languages)
+        attrs["success"] = bool(result.get('success'))
+        if cancel.is_set() and not result.get('success'):
+            attrs["cancelled"] = True
+        return result
+
+
+async def _race(video_id: str, languages: list, strategies: list, stagger: float) -> list:
+    """Start strategies `stagger` seconds apart (sooner if all running ones failed); first success wins.
+
+    A strategy that finds the video has no captions ends the race too.
+
+    Returns the finished results as [(name, result), ...], the winner last.
+    """
+    loop = asyncio.get_running_loop()
+    cancel = threading.Event()
+
+    async def run(name, fn):
+        start = time.time()
+        try:
+            result = await event_loop.offload(_run_strategy, name, fn, video_id, cancel, languages)
+        except Exception as e:
+            result = {'success': False, 'text': None, 'error': str(e)}
+        return name, result, time.time() - start
+
+    pending = set()
+
+    def launch(index):
+        name, fn = strategies[index]
+        pending.add(asyncio.ensure_future(run(name, fn)))
+
+    launch(0)
+    next_index = 1
+    next_start = loop.time() + stagger
+    results = []
+    try:
+        while pending or next_index < len(strategies):
+            finished = set()
+            if pending:
+                # Everything running has failed once pending is empty: start the next one now
+                timeout = max(0.0, next_start - loop.time()) if next_index < len(strategies) else None
+                finished, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                pending.difference_update(finished)
+            if not finished:
+                launch(next_index)
+                next_index += 1
+                next_start = loop.time() + stagger
+                continue
+
+            finished = list(finished)
+            for i, task in enumerate(finished):
+                name, result, seconds = task.result()
+                results.append((name, result))
+                # A transcript, or YouTube saying there are no captions, settles the race
+                if result.get('success') or result.get('no_captions'):
+                    cancel.set()
+                    if result.get('success'):
+                        strategy_stats.record(name, 'win', seconds)
+                        logger.info(f"✓ YouTube strategy '{name}' won the race in {seconds:.2f}s")
+                    else:
+                        strategy_stats.record(name, 'failure', seconds)
+                        logger.info(f"YouTube strategy '{name}' found no captions for {video_id}")
+                    for loser in finished[i + 1:]:
+                        _record_loser(loser, cancelled=False)
+                    for loser in pending:
+                        loser.add_done_callback(_record_loser)
+                    return results
+                strategy_stats.record(name, 'failure', seconds)
+        return results
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
+
+
+def _record_loser(task: asyncio.Future, cancelled: bool = True):
+    """Record a strategy that lost: cancelled if it was still running when the race ended."""
+    # A loser that succeeded anyway was cancelled too late to save anything
+    name, result, seconds = task.result()
+    if result.get('success'):
+        strategy_stats.record(name, 'loss', seconds)
+    else:
+        strategy_stats.record(name, 'cancelled' if cancelled else 'failure', seconds)
@@ -0,0 +1,248 @@
+"""Warm yt-dlp helper processes for subtitle downloads.
+
+Running `python -m yt_dlp` per request pays for a fresh interpreter, the
+yt-dlp import and extractor loading every time, and a hung run pins a worker
+forever. Instead, a small pool of long-lived helper processes (this file run
+as a script) import yt-dlp once and serve subtitle requests over JSON lines on
+stdin/stdout. Subtitles are read straight into memory, and the same helpers
+list playlist and channel URLs for batch ingestion. A helper that times out
+or whose job is cancelled is killed and replaced on the next request.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import subprocess
+import logging
+
+logger = logging.getLogger(__name__)
+
+YTDLP_WORKERS = int(os.getenv('YTDLP_WORKERS', 2))
+YTDLP_TIMEOUT = float(os.getenv('YTDLP_TIMEOUT', 120))
+
+_POLL_SECONDS = 0.2
+
+
+class _Helper:
+    """One warm helper process and the thread reading its replies."""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1
+        )
+        self.replies = queue.Queue()
+        self.jobs = 0
+        threading.Thread(target=self._read, name=f"ytdlp-helper-{self.process.pid}", daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            try:
+                self.replies.put(json.loads(line))
+            except ValueError:
+                continue
+        self.replies.put(None)  # helper exited
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def send(self, message: dict):
+        self.process.stdin.write(json.dumps(message) + '\n')
+        self.process.stdin.flush()
+        self.jobs += 1
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+class YtDlpPool:
+    """Bounded pool of warm yt-dlp helpers with a hard per-job timeout and cancellation."""
+
+    def __init__(self, size: int, timeout: float):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._counters = {"jobs": 0, "timeouts": 0, "cancelled": 0, "crashes": 0, "started": 0}
+        self._pid = None
+
+    def _ensure_pid(self):
+        # Helpers (and their pipes) belong to the process that started them
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._idle = queue.LifoQueue()
+                self._slots = threading.BoundedSemaphore(self.size)
+                self._pid = os.getpid()
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _checkout(self) -> _Helper:
+        while True:
+            try:
+                helper = self._idle.get_nowait()
+            except queue.Empty:
+                self._count("started")
+                return _Helper()
+            if helper.alive():
+                return helper
+
+    def download_subtitles(self, video_id: str, languages: list, proxy: str = None,
+                           cancel: threading.Event = None, timeout: float = None) -> dict:
+        """Fetch the best subtitle track for video_id in a warm helper.
+
+        Returns: {'success': bool, 'vtt': str, 'track': {...}, 'error': str or None}
+        """
+        return self._request({"videoId": video_id, "languages": languages, "proxy": proxy},
+                             {'vtt': None}, cancel, timeout)
+
+    def expand_playlist(self, url: str, proxy: str = None, cancel: threading.Event = None,
+                        timeout: float = None) -> dict:
+        """List the videos of a playlist or channel URL without resolving each one.
+
+        Returns: {'success': bool, 'entries': [{'id', 'title'}, ...], 'title': str, 'error': str or None}
+        """
+        return self._request({"op": "playlist", "url": url, "proxy": proxy}, {'entries': []}, cancel, timeout)
+
+    def _request(self, message: dict, empty: dict, cancel: threading.Event = None, timeout: float = None) -> dict:
+        self._ensure_pid()
+        cancel = cancel or threading.Event()
+        timeout = timeout or self.timeout
+        deadline = time.time() + timeout
+
+        # Wait for a free helper slot without ignoring cancellation
+        while not self._slots.acquire(timeout=_POLL_SECONDS):
+            if cancel.is_set() or time.time() > deadline:
+                return {**empty, **self._stopped(cancel, timeout)}
+
+        helper = None
+        try:
+            helper = self._checkout()
+            self._count("jobs")
+            helper.send(message)
+            while True:
+                try:
+                    reply = helper.replies.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    if cancel.is_set() or time.time() > deadline:
+                        helper.kill()
+                        helper = None
+                        return {**empty, **self._stopped(cancel, timeout)}
+                    continue
+                if reply is None:
+                    self._count("crashes")
+                    helper = None
+                    return {**empty, 'success': False, 'error': 'yt-dlp helper exited unexpectedly'}
+                self._idle.put(helper)
+                helper = None
+                return reply
+        except Exception as e:
+            return {**empty, 'success': False, 'error': f"yt-dlp helper failed: {e}"}
+        finally:
+            if helper is not None:
+                helper.kill()
+            self._slots.release()
+
+    def _stopped(self, cancel: threading.Event, timeout: float) -> dict:
+        if cancel.is_set():
+            self._count("cancelled")
+            return {'success': False, 'error': 'yt-dlp cancelled'}
+        self._count("timeouts")
+        return {'success': False, 'error': f'yt-dlp timed out after {timeout:.0f}s'}
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        idle = self._idle.qsize() if self._pid == os.getpid() else 0
+        return {**counters, "size": self.size, "idle": idle, "timeout": self.timeout}
+
+
+ytdlp_pool = YtDlpPool(YTDLP_WORKERS, YTDLP_TIMEOUT)
+
+
+# ---------------------------------------------------------------------------
+# Helper process side
+# ---------------------------------------------------------------------------
+
+def _pick_track(info: dict, languages: list):
+    """Best VTT subtitle for the language preference, manual before auto-generated per language."""
+    manual = info.get('subtitles') or {}
+    automatic = info.get('automatic_captions') or {}
+    for code in languages:
+        for tracks, generated in ((manual, False), (automatic, True)):
+            formats = tracks.get(code) or []
+            vtt = next((f for f in formats if f.get('ext') == 'vtt' and f.get('url')), None)
+            if vtt:
+                return code, generated, vtt
+    return None
+
+
+def _list_playlist(ydl, url: str) -> dict:
+    info = ydl.extract_info(url, download=False)
+    entries = []
+
+    def collect(node):
+        for entry in node.get('entries') or []:
+            if not entry:
+                continue
+            # Channel pages nest their tabs (videos, shorts, ...) as playlists
+            if entry.get('_type') == 'playlist' or entry.get('entries'):
+                collect(entry)
+            elif entry.get('id'):
+                entries.append({'id': entry['id'], 'title': entry.get('title')})
+
+    collect(info)
+    return {'success': True, 'entries': entries, 'title': info.get('title'), 'error': None}
+
+
+def _serve():
+    import yt_dlp
+
+    # yt-dlp may print to stdout; keep the real stdout for replies only
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    clients = {}
+
+    for line in sys.stdin:
+        try:
+            job = json.loads(line)
+            proxy = job.get('proxy')
+            flat = job.get('op') == 'playlist'
+            ydl = clients.get((proxy, flat))
+            if ydl is None:
+                opts = {'quiet': True, 'no_warnings': True, 'skip_download': True, 'noprogress': True}
+                if flat:
+                    opts['extract_flat'] = 'in_playlist'
+                if proxy:
+                    opts['proxy'] = proxy
+                ydl = clients[(proxy, flat)] = yt_dlp.YoutubeDL(opts)
+            if flat:
+                reply = _list_playlist(ydl, job['url'])
+            else:
+                info = ydl.extract_info(f"https://www.youtube.com/watch?v={job['videoId']}", download=False)
+                picked = _pick_track(info, job.get('languages') or ['en'])
+                if not picked:
+                    reply = {'success': False, 'vtt': None, 'error': 'yt-dlp found no subtitles'}
+                else:
+                    code, generated, fmt = picked
+                    vtt = ydl.urlopen(fmt['url']).read().decode('utf-8', 'replace')
+                    reply = {'success': True, 'vtt': vtt, 'error': None,
+                             'track': {'language': fmt.get('name') or code, 'languageCode': code,
+                                       'isGenerated': generated, 'translatedFrom': None}}
+        except Exception as e:
+            reply = {'success': False, 'error': f"yt-dlp failed: {e}"}
+        out.write(json.dumps(reply) + '\n')
+        out.flush()
+
+
+if __name__ == '__main__':
+    _serve()
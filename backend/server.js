@@ -92,8 +92,10 @@ app.post('/api/upload-video', upload.single('video'), async (req, res) => {
       const response = await axios.post(`${PYTHON_SERVICE_URL}/api/process-video`, {
         jobId,
         videoPath,
-        filename: req.file.filename
+        filename: req.file.filename,
+        regenerate: req.body.regenerate === 'true'
       }, {
+        headers: { 'X-Trace-Id': jobId },
         timeout: 300000 // 5 minute timeout for video processing
       })
 
@@ -118,7 +120,9 @@ app.post('/api/upload-video', upload.single('video'), async (req, res) => {
         },
         imageSuggestions: result.imageSuggestions || [],
         socialSnippets: result.socialSnippets || {},
-        availableExports: result.availableExports || []
+        availableExports: result.availableExports || [],
+        cache: result.cache || {},
+        timings: result.timings || null
       }
 
       console.log('Response data structure:')
@@ -159,14 +163,96 @@ app.post('/api/upload-video', upload.single('video'), async (req, res) => {
  * Get job status
  * GET /api/status/:jobId
  */
-app.get('/api/status/:jobId', (req, res) => {
+app.get('/api/status/:jobId', async (req, res) => {
   const { jobId } = req.params
-  // In a real app, this would check a database or queue
-  res.json({
-    jobId,
-    status: 'completed',
-    message: 'Video processing completed'
-  })
+  try {
+    const response = await axios.get(`${PYTHON_SERVICE_URL}/api/jobs/${encodeURIComponent(jobId)}`, {
+      timeout: 10000
+    })
+    res.json(response.data)
+  } catch (error) {
+    if (error.response) {
+      return res.status(error.response.status).json(error.response.data)
+    }
+    console.error('Error fetching job status:', error.message)
+    res.status(502).json({ jobId, error: 'AI service unavailable' })
+  }
+})
+
+/**
+ * Get a finished job's trace (per-stage and outbound call spans)
+ * GET /api/traces/:jobId
+ */
+app.get('/api/traces/:jobId', async (req, res) => {
+  const { jobId } = req.params
+  try {
+    const response = await axios.get(`${PYTHON_SERVICE_URL}/api/traces/${encodeURIComponent(jobId)}`, {
+      timeout: 10000
+    })
+    res.json(response.data)
+  } catch (error) {
+    if (error.response) {
+      return res.status(error.response.status).json(error.response.data)
+    }
+    console.error('Error fetching trace:', error.message)
+    res.status(502).json({ jobId, error: 'AI service unavailable' })
+  }
+})
+
+/**
+ * Relay a job's server-sent events from the Python service
+ * GET /api/jobs/:jobId/stream
+ */
+app.get('/api/jobs/:jobId/stream', async (req, res) => {
+  const { jobId } = req.params
+  try {
+    const response = await axios.get(`${PYTHON_SERVICE_URL}/api/jobs/${encodeURIComponent(jobId)}/stream`, {
+      responseType: 'stream',
+      headers: req.headers['last-event-id'] ? { 'Last-Event-ID': req.headers['last-event-id'] } : {},
+      timeout: 0
+    })
+    res.set({
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache',
+      'X-Accel-Buffering': 'no'
+    })
+    res.flushHeaders()
+    response.data.pipe(res)
+    req.on('close', () => response.data.destroy())
+  } catch (error) {
+    if (error.response) {
+      return res.status(error.response.status).json({ jobId, error: 'Job not found' })
+    }
+    console.error('Error streaming job events:', error.message)
+    res.status(502).json({ jobId, error: 'AI service unavailable' })
+  }
+})
+
+/**
+ * Relay a batch of YouTube videos/playlists, streaming NDJSON lines as each video finishes
+ * POST /api/process-youtube/batch
+ */
+app.post('/api/process-youtube/batch', async (req, res) => {
+  try {
+    const response = await axios.post(`${PYTHON_SERVICE_URL}/api/process-youtube/batch`, req.body, {
+      responseType: 'stream',
+      timeout: 0
+    })
+    res.set({
+      'Content-Type': 'application/x-ndjson',
+      'Cache-Control': 'no-cache',
+      'X-Accel-Buffering': 'no'
+    })
+    res.flushHeaders()
+    response.data.pipe(res)
+    req.on('close', () => response.data.destroy())
+  } catch (error) {
+    if (error.response) {
+      return res.status(error.response.status).json({ error: 'Batch request rejected by AI service' })
+    }
+    console.error('Error relaying batch:', error.message)
+    res.status(502).json({ error: 'AI service unavailable' })
+  }
 })
 
 /**
@@ -181,17 +267,28 @@ app.post('/api/process-youtube', async (req, res) => {
       return res.status(400).json({ error: 'No YouTube URL provided' })
     }
 
+    const jobId = uuidv4()
     console.log(`✓ YouTube URL received: ${youtubeUrl}`)
 
     // Call Python service to process the YouTube URL
     try {
       const response = await axios.post(`${PYTHON_SERVICE_URL}/api/process-youtube`, {
-        jobId: require('uuid').v4(),
-        youtubeUrl
+        jobId,
+        youtubeUrl,
+        async: Boolean(req.body.async),
+        regenerate: Boolean(req.body.regenerate),
+        languages: req.body.languages
       }, {
+        headers: { 'X-Trace-Id': jobId },
         timeout: 120000 // 2 minute timeout for YouTube processing
       })
 
+      // Queued job: the client polls /api/status/:jobId for the result
+      if (response.status === 202) {
+        console.log(`✓ YouTube job queued: ${response.data.jobId}`)
+        return res.status(202).json(response.data)
+      }
+
       console.log(`✓ YouTube processing completed`)
       const result = response.data
 
@@ -201,6 +298,7 @@ app.post('/api/process-youtube', async (req, res) => {
         status: result.status || 'completed',
         source: 'youtube',
         videoId: result.videoId || '',
+        captionTrack: result.captionTrack || null,
         transcript: result.transcript || '',
         blog: result.blog || { title: '', sections: [] },
         seo: result.seo || {
@@ -213,7 +311,9 @@ app.post('/api/process-youtube', async (req, res) => {
         imageSuggestions: result.imageSuggestions || [],
         warnings: result.warnings || [],
         socialSnippets: result.socialSnippets || {},
-        availableExports: result.availableExports || []
+        availableExports: result.availableExports || [],
+        cache: result.cache || {},
+        timings: result.timings || null
       }
 
       res.json(finalResult)
@@ -249,8 +349,11 @@ app.post('/api/youtube-url', async (req, res) => {
     try {
       const response = await axios.post(`${PYTHON_SERVICE_URL}/api/process-youtube`, {
         jobId,
-        youtubeUrl
+        youtubeUrl,
+        regenerate: Boolean(req.body.regenerate),
+        languages: req.body.languages
       }, {
+        headers: { 'X-Trace-Id': jobId },
         timeout: 120000 // 2 minute timeout for YouTube processing
       })
 
@@ -263,6 +366,7 @@ app.post('/api/youtube-url', async (req, res) => {
         status: result.status || 'completed',
         source: 'youtube',
         videoId: result.videoId || '',
+        captionTrack: result.captionTrack || null,
         transcript: result.transcript || '',
         blog: result.blog || { title: '', sections: [] },
         seo: result.seo || {
@@ -275,7 +379,9 @@ app.post('/api/youtube-url', async (req, res) => {
         imageSuggestions: result.imageSuggestions || [],
         warnings: result.warnings || [],
         socialSnippets: result.socialSnippets || {},
-        availableExports: result.availableExports || []
+        availableExports: result.availableExports || [],
+        cache: result.cache || {},
+        timings: result.timings || null
       }
 
       res.json(finalResult)
@@ -312,8 +418,17 @@ app.post('/api/social-snippets', async (req, res) => {
  */
 app.post('/api/export', async (req, res) => {
   try {
-    const response = await axios.post(`${PYTHON_SERVICE_URL}/api/export`, req.body);
-    res.json(response.data);
+    // Relay as bytes so ZIP archives, ETags and 304 responses pass through untouched
+    const response = await axios.post(`${PYTHON_SERVICE_URL}/api/export`, req.body, {
+      params: req.query,
+      headers: req.headers['if-none-match'] ? { 'If-None-Match': req.headers['if-none-match'] } : {},
+      responseType: 'arraybuffer',
+      validateStatus: (status) => status < 500
+    });
+    for (const header of ['content-type', 'content-disposition', 'etag', 'cache-control']) {
+      if (response.headers[header]) res.set(header, response.headers[header]);
+    }
+    res.status(response.status).send(response.status === 304 ? undefined : Buffer.from(response.data));
   } catch (error) {
     console.error('Error proxying export:', error.message);
     res.status(500).json({ error: 'Failed to export content' });
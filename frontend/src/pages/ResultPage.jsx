@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { useNavigate, useLocation } from 'react-router-dom'
 import { motion } from 'framer-motion'
 import { Navigation } from '../components/Layout'
@@ -12,6 +12,7 @@ export default function ResultPage() {
   const [result, setResult] = useState(null)
   const [showUpload, setShowUpload] = useState(false)
   const [activeTab, setActiveTab] = useState('blog')
+  const exportsRef = useRef(null)
   const navigate = useNavigate()
   const location = useLocation()
 
@@ -62,22 +63,33 @@ export default function ResultPage() {
 
   const heroImage = result.imageSuggestions?.find(img => img.type === 'hero' || img.section === 'Hero')?.imageUrl || result.imageSuggestions?.[0]?.imageUrl
 
+  // Every format comes back from one export call, then downloads are served locally
+  const fetchExports = () => {
+    if (!exportsRef.current || exportsRef.current.result !== result) {
+      const apiUrl = import.meta.env.VITE_API_URL || ''
+      const request = fetch(`${apiUrl}/api/export`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ blog: { ...result.blog, seo: result.seo }, formats: 'all' })
+      })
+        .then(res => res.json())
+        .then(data => data.formats)
+      request.catch(() => { exportsRef.current = null })
+      exportsRef.current = { result, request }
+    }
+    return exportsRef.current.request
+  }
+
   const downloadBlog = (format) => {
-    const apiUrl = import.meta.env.VITE_API_URL || ''
-    fetch(`${apiUrl}/api/export`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ blog: result.blog, format: format })
-    })
-      .then(res => res.json())
-      .then(data => {
-        const blob = new Blob([data.content], { type: 'text/plain' });
-        const url = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = `${result.blog.title.slice(0, 20)}${data.extension}`;
-        a.click();
-      });
+    fetchExports().then(formats => {
+      const data = formats[format]
+      const blob = new Blob([data.content], { type: 'text/plain' });
+      const url = window.URL.createObjectURL(blob);
+      const a = document.createElement('a');
+      a.href = url;
+      a.download = `${result.blog.title.slice(0, 20)}${data.extension}`;
+      a.click();
+    });
   }
 
   const copyToClipboard = (text) => {